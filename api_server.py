@@ -4,17 +4,29 @@ FastAPI implementation with Azure Cosmos DB and Blob Storage integration
 """
 
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from pymongo import MongoClient
 from dotenv import load_dotenv
-import bcrypt
+import json
 import os
+import threading
 import traceback
 
 # Load environment variables
 load_dotenv()
 
+from auth import AuthBusyError, UserStore, password_hasher
+from request_options import bootstrap_options, budget_sweep, parse_window
+from request_timing import finish_request, server_timing_header, stage, stage_metrics, start_request
+from result_cache import ResultCache, portfolio_key
+
+# numpy/pandas come in with market_data and portfolio_manager, imported on first use (normally by the
+# background preload below) rather than at startup, so the process answers /api/ping and /api/ready right away
+MARKET_DATA_PRELOAD = os.getenv("MARKET_DATA_PRELOAD", "background")  # "background", "blocking" or "off"
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "512"))  # Portfolios scored per shared matrix product
+MAX_OPTIMIZE_ITERATIONS = int(os.getenv("MAX_OPTIMIZE_ITERATIONS", "1000"))
+MAX_FRONTIER_POINTS = int(os.getenv("MAX_FRONTIER_POINTS", "200"))
+
 # Flask setup
 app = Flask(__name__)
 CORS(app)
@@ -23,9 +35,7 @@ CORS(app)
 mongo_uri = os.getenv("MONGO_URI")
 mongo_db = os.getenv("MONGO_DB")
 
-client = MongoClient(mongo_uri)
-db = client[mongo_db]
-users_collection = db["users"]
+users = UserStore(mongo_uri, mongo_db)  # Connects on first use
 
 @app.route("/api/ping")
 def ping():
@@ -42,18 +52,19 @@ def register():
         if not email or not password:
             return jsonify({"error": "Email and password required"}), 400
 
-        if users_collection.find_one({"email": email}):
+        if users.find(email):
             return jsonify({"error": "User already exists"}), 409
 
-        password_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+        password_hash = password_hasher.hash(password).result()
 
-        users_collection.insert_one({
-            "email": email,
-            "password_hash": password_hash
-        })
+        if not users.insert(email, password_hash):
+            return jsonify({"error": "User already exists"}), 409  # Registered concurrently since the check above
 
         return jsonify({"message": "User registered successfully!"}), 201
 
+    except AuthBusyError as e:
+        return jsonify({"error": str(e)}), 429
+
     except Exception as e:
         print("❌ Error in /api/register:", e)
         traceback.print_exc()  # This prints the full stack trace in terminal
@@ -69,15 +80,18 @@ def login():
         if not email or not password:
             return jsonify({"error": "Email and password required"}), 400
 
-        user = users_collection.find_one({"email": email})
+        user = users.find(email)
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        if not bcrypt.checkpw(password.encode("utf-8"), user["password_hash"]):
+        if not password_hasher.check(password, user["password_hash"]).result():
             return jsonify({"error": "Incorrect password"}), 401
 
         return jsonify({"message": "Login successful!"}), 200
 
+    except AuthBusyError as e:
+        return jsonify({"error": str(e)}), 429
+
     except Exception as e:
         print("❌ Error in /api/login:", e)
         traceback.print_exc()
@@ -85,30 +99,104 @@ def login():
 
 
 
+# Recommendation results, shared by users with the same holdings; flushed when the market data reloads
+result_cache = ResultCache()
+
+market_data_ready = threading.Event()
+preload_error = None
+
+
+def current_market_data():
+    """The process-wide market data; the first call imports numpy/pandas and loads it (requests then reuse it)."""
+    from market_data import get_market_data
+
+    market_data = get_market_data()
+    market_data_ready.set()
+    return market_data
+
+
+def preload():
+    """Load and warm the market data artifact and connect to Mongo ahead of the first request."""
+    global preload_error
+    try:
+        current_market_data()
+        preload_error = None
+    except Exception as e:
+        preload_error = str(e)
+        print("⚠️ Market data not loaded at startup:", e)
+    try:
+        users.collection
+    except Exception as e:
+        print("⚠️ Could not connect to MongoDB at startup:", e)
+
 
-import pandas as pd
-from portfolio_manager import PortfolioManager
+if MARKET_DATA_PRELOAD == "background":
+    threading.Thread(target=preload, name="preload", daemon=True).start()
+elif MARKET_DATA_PRELOAD == "blocking":
+    preload()
+
+
+@app.route("/api/ready")
+def ready():
+    """Readiness probe: 200 once the market data is loaded and warm, 503 until then."""
+    if market_data_ready.is_set():
+        return jsonify({"ready": True})
+    return jsonify({"ready": False, "error": preload_error}), 503
+
+
+@app.before_request
+def start_timing():
+    g.timing = start_request()
+
+
+@app.after_request
+def add_server_timing(response):
+    timings = finish_request(g.pop("timing", None), request.url_rule.rule if request.url_rule else "unmatched")
+    if timings:
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(stage_metrics.prometheus_text(), mimetype="text/plain; version=0.0.4")
 
-CSV_PATH = "historical_adjusted_prices.csv"
 
 @app.route("/api/buy", methods=["POST"])
 def recommend_buy():
+    from portfolio_manager import portfolio_recommendations
+
     try:
         data = request.get_json()
         tickers = data.get("tickers", [])
         amounts = data.get("amounts", [])
         budget = float(data.get("budget", 0))
+        budgets, error = budget_sweep(data.get("budgets"))  # Optional budget sweep: rank every amount in one pass
 
         if not tickers or not amounts or len(tickers) != len(amounts):
             return jsonify({"error": "Invalid portfolio format"}), 400
-
-        historical_data = pd.read_csv(CSV_PATH, index_col="Date", parse_dates=True)
-        pm = PortfolioManager(tickers, amounts, historical_data)
-
-        result = pm.get_buy_recommendations(budget)
-        result["portfolio_value"] = pm.portfolio_value  # Add total value for context
-
-        return jsonify(result)
+        if error:
+            return jsonify({"error": error}), 400
+
+        with stage("market_data"):
+            market_data = current_market_data()
+        window, error = parse_window(data, market_data)
+        if error:
+            return jsonify({"error": error}), 400
+        # Optional confidence intervals for the top candidates: true or {"resamples": ..., "block_length": ...}
+        bootstrap, error = bootstrap_options(data.get("bootstrap"))
+        if error:
+            return jsonify({"error": error}), 400
+
+        key = portfolio_key("buy", tickers, amounts, budgets or budget, market_data.version, window=window, bootstrap=bootstrap)
+        result = result_cache.get_or_compute(
+            key,
+            lambda: portfolio_recommendations(market_data, "buy", tickers, amounts, budget, budgets, window, bootstrap),
+            market_data.version,
+        )
+
+        with stage("serialize"):
+            return jsonify(result)
 
     except Exception as e:
         print("❌ Error in /api/buy:", e)
@@ -119,25 +207,300 @@ def recommend_buy():
 
 @app.route("/api/sell", methods=["POST"])
 def recommend_sell():
+    from portfolio_manager import portfolio_recommendations
+
     try:
         data = request.get_json()
         tickers = data.get("tickers", [])
         amounts = data.get("amounts", [])
         budget = float(data.get("budget", 0))
+        budgets, error = budget_sweep(data.get("budgets"))  # Optional budget sweep: rank every amount in one pass
 
         if not tickers or not amounts or len(tickers) != len(amounts):
             return jsonify({"error": "Invalid portfolio format"}), 400
+        if error:
+            return jsonify({"error": error}), 400
+
+        with stage("market_data"):
+            market_data = current_market_data()
+        window, error = parse_window(data, market_data)
+        if error:
+            return jsonify({"error": error}), 400
+        # Optional confidence intervals for the top candidates: true or {"resamples": ..., "block_length": ...}
+        bootstrap, error = bootstrap_options(data.get("bootstrap"))
+        if error:
+            return jsonify({"error": error}), 400
+
+        key = portfolio_key("sell", tickers, amounts, budgets or budget, market_data.version, window=window, bootstrap=bootstrap)
+        result = result_cache.get_or_compute(
+            key,
+            lambda: portfolio_recommendations(market_data, "sell", tickers, amounts, budget, budgets, window, bootstrap),
+            market_data.version,
+        )
+
+        with stage("serialize"):
+            return jsonify(result)
+
+    except Exception as e:
+        print("❌ Error in /api/sell:", e)
+        traceback.print_exc()
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+@app.route("/api/swap", methods=["POST"])
+def recommend_swap():
+    from portfolio_manager import portfolio_recommendations
+
+    try:
+        data = request.get_json()
+        tickers = data.get("tickers", [])
+        amounts = data.get("amounts", [])
+        budget = float(data.get("budget", 0))  # Amount sold from one holding and bought of another stock
+
+        if not tickers or not amounts or len(tickers) != len(amounts):
+            return jsonify({"error": "Invalid portfolio format"}), 400
+
+        with stage("market_data"):
+            market_data = current_market_data()
+        window, error = parse_window(data, market_data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        key = portfolio_key("swap", tickers, amounts, budget, market_data.version, window=window)
+        result = result_cache.get_or_compute(
+            key,
+            lambda: portfolio_recommendations(market_data, "swap", tickers, amounts, budget, window=window),
+            market_data.version,
+        )
+
+        with stage("serialize"):
+            return jsonify(result)
+
+    except Exception as e:
+        print("❌ Error in /api/swap:", e)
+        traceback.print_exc()
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+
+@app.route("/api/optimize", methods=["POST"])
+def optimize_portfolio():
+    from portfolio_manager import PortfolioManager
+
+    try:
+        data = request.get_json()
+        tickers = data.get("tickers", [])
+        amounts = data.get("amounts", [])
+        amount = float(data.get("amount", 5000))
+        max_iterations = data.get("max_iterations", 300)
+
+        if not tickers or not amounts or len(tickers) != len(amounts) or amount <= 0:
+            return jsonify({"error": "Invalid portfolio format"}), 400
+        if isinstance(max_iterations, bool) or not isinstance(max_iterations, int) or max_iterations < 1:
+            return jsonify({"error": "Max iterations must be a positive integer"}), 400
+        max_iterations = min(max_iterations, MAX_OPTIMIZE_ITERATIONS)
 
-        historical_data = pd.read_csv(CSV_PATH, index_col="Date", parse_dates=True)
-        pm = PortfolioManager(tickers, amounts, historical_data)
+        with stage("market_data"):
+            market_data = current_market_data()
+        window, error = parse_window(data, market_data)
+        if error:
+            return jsonify({"error": error}), 400
 
-        result = pm.get_sell_recommendations(budget)
-        result["portfolio_value"] = pm.portfolio_value  # Add total value
+        pm = PortfolioManager(tickers, amounts, market_data, window=window)
+
+        with stage("optimize"):
+            result = pm.optimize_greedy(amount, max_iterations)
+        result["portfolio"] = {stock: weight * pm.portfolio_value for stock, weight in pm.portfolio_weights.items()}
+        result["portfolio_value"] = pm.portfolio_value
 
         return jsonify(result)
 
     except Exception as e:
-        print("❌ Error in /api/sell:", e)
+        print("❌ Error in /api/optimize:", e)
+        traceback.print_exc()
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+@app.route("/api/solve", methods=["POST"])
+def solve_portfolio():
+    from portfolio_manager import PortfolioManager
+
+    try:
+        data = request.get_json()
+        tickers = data.get("tickers", [])
+        amounts = data.get("amounts", [])
+        mode = data.get("mode", "max_sharpe")
+        target_return = data.get("target_return")
+        cap = data.get("cap")
+
+        if not tickers or not amounts or len(tickers) != len(amounts):
+            return jsonify({"error": "Invalid portfolio format"}), 400
+        if mode not in ("max_sharpe", "min_variance"):
+            return jsonify({"error": "Mode must be 'max_sharpe' or 'min_variance'"}), 400
+
+        with stage("market_data"):
+            market_data = current_market_data()
+        window, error = parse_window(data, market_data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        pm = PortfolioManager(tickers, amounts, market_data, window=window)
+
+        try:
+            with stage("solve"):
+                result = pm.solve_target_weights(
+                    mode,
+                    None if target_return is None else float(target_return),
+                    None if cap is None else float(cap),
+                )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400  # Infeasible cap or unreachable target return
+        result["portfolio_value"] = pm.portfolio_value
+
+        return jsonify(result)
+
+    except Exception as e:
+        print("❌ Error in /api/solve:", e)
+        traceback.print_exc()
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+@app.route("/api/frontier", methods=["POST"])
+def efficient_frontier():
+    from portfolio_manager import PortfolioManager
+
+    try:
+        data = request.get_json()
+        tickers = data.get("tickers", [])
+        amounts = data.get("amounts", [])
+        points = data.get("points", 50)
+        cap = data.get("cap")
+        candidates = data.get("candidates")  # Optional: only the holdings plus this many top buy candidates
+        budget = data.get("budget")  # Buy amount the candidates are ranked for
+
+        if not tickers or not amounts or len(tickers) != len(amounts):
+            return jsonify({"error": "Invalid portfolio format"}), 400
+        if isinstance(points, bool) or not isinstance(points, int) or not 2 <= points <= MAX_FRONTIER_POINTS:
+            return jsonify({"error": f"Points must be an integer between 2 and {MAX_FRONTIER_POINTS}"}), 400
+        if candidates is not None and (isinstance(candidates, bool) or not isinstance(candidates, int) or candidates < 0):
+            return jsonify({"error": "Candidates must be a non-negative integer"}), 400
+
+        with stage("market_data"):
+            market_data = current_market_data()
+        window, error = parse_window(data, market_data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        pm = PortfolioManager(tickers, amounts, market_data, window=window)
+
+        try:
+            with stage("solve"):
+                result = pm.efficient_frontier(
+                    points,
+                    None if cap is None else float(cap),
+                    candidates,
+                    None if budget is None else float(budget),
+                )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400  # Infeasible cap
+        result["portfolio_value"] = pm.portfolio_value
+
+        with stage("serialize"):
+            return jsonify(result)
+
+    except Exception as e:
+        print("❌ Error in /api/frontier:", e)
         traceback.print_exc()
         return jsonify({"error": "Internal Server Error"}), 500
 
+
+@app.route("/api/diversification", methods=["POST"])
+def diversification():
+    from portfolio_manager import PortfolioManager
+
+    try:
+        data = request.get_json()
+        tickers = data.get("tickers", [])
+        amounts = data.get("amounts", [])
+        threshold = data.get("threshold", 0.7)  # Correlation that puts two holdings in one cluster
+
+        if not tickers or not amounts or len(tickers) != len(amounts):
+            return jsonify({"error": "Invalid portfolio format"}), 400
+        try:
+            threshold = float(threshold)
+        except (ValueError, TypeError):
+            return jsonify({"error": "Threshold must be a number"}), 400
+        if not -1 <= threshold <= 1:
+            return jsonify({"error": "Threshold must be a correlation between -1 and 1"}), 400
+
+        with stage("market_data"):
+            market_data = current_market_data()
+        window, error = parse_window(data, market_data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        pm = PortfolioManager(tickers, amounts, market_data, window=window)
+        if not pm.portfolio_weights:
+            return jsonify({"error": "None of the tickers have market data"}), 400
+
+        with stage("analytics"):
+            result = pm.diversification(threshold)
+        result["portfolio_value"] = pm.portfolio_value
+
+        with stage("serialize"):
+            return jsonify(result)
+
+    except Exception as e:
+        print("❌ Error in /api/diversification:", e)
+        traceback.print_exc()
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+@app.route("/api/batch", methods=["POST"])
+def recommend_batch():
+    from portfolio_manager import batch_recommendations
+
+    try:
+        data = request.get_json()
+        portfolios = data.get("portfolios", [])
+        actions = data.get("actions", ["buy", "sell"])
+        stream = bool(data.get("stream", False))
+
+        if not portfolios or not set(actions) <= {"buy", "sell"}:
+            return jsonify({"error": "Invalid batch format"}), 400
+        for i, portfolio in enumerate(portfolios):
+            tickers = portfolio.get("tickers", [])
+            amounts = portfolio.get("amounts", [])
+            if not tickers or not amounts or len(tickers) != len(amounts) or sum(amounts) <= 0:
+                return jsonify({"error": f"Invalid portfolio format at index {i}"}), 400
+
+        with stage("market_data"):
+            market_data = current_market_data()
+        window, error = parse_window(data, market_data)
+        if error:
+            return jsonify({"error": error}), 400
+        chunks = (portfolios[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(portfolios), BATCH_CHUNK_SIZE))
+
+        if stream:
+            # One JSON result per line, sent as soon as its chunk is scored
+            def generate():
+                for chunk in chunks:
+                    for result in batch_recommendations(market_data, chunk, actions, window=window):
+                        yield json.dumps(result) + "\n"
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+        results = []
+        with stage("rank"):
+            for chunk in chunks:
+                results.extend(batch_recommendations(market_data, chunk, actions, window=window))
+        with stage("serialize"):
+            return jsonify({"results": results})
+
+    except Exception as e:
+        print("❌ Error in /api/batch:", e)
+        traceback.print_exc()
+        return jsonify({"error": "Internal Server Error"}), 500
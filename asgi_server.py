@@ -0,0 +1,197 @@
+"""
+Portfolio Optimization API Server (ASGI)
+FastAPI version of the api_server routes. Recommendation ranking runs in a bounded process pool
+whose workers keep the market data loaded, so CPU-heavy requests don't hold up logins.
+Run with: uvicorn asgi_server:app --host 0.0.0.0 --port $PORT
+"""
+
+import asyncio
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from fastapi import Body, FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+
+from auth import AuthBusyError, UserStore, password_hasher
+from market_data import get_market_data
+from portfolio_manager import portfolio_recommendations
+from request_options import bootstrap_options, budget_sweep, parse_window
+from result_cache import ResultCache, portfolio_key
+
+# Load environment variables
+load_dotenv()
+
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", str(os.cpu_count() or 1)))
+COMPUTE_QUEUE_LIMIT = int(os.getenv("COMPUTE_QUEUE_LIMIT", str(4 * COMPUTE_WORKERS)))  # Ranking jobs queued or running
+
+# MongoDB setup
+mongo_uri = os.getenv("MONGO_URI")
+mongo_db = os.getenv("MONGO_DB")
+
+users = UserStore(mongo_uri, mongo_db)  # Connects on first use
+
+# Recommendation results, shared by users with the same holdings; flushed when the market data reloads
+result_cache = ResultCache()
+
+
+def _init_worker():
+    """Load the market data once per pool process, before its first job."""
+    try:
+        get_market_data()
+    except Exception as e:
+        print("⚠️ Market data not loaded in compute worker:", e)
+
+
+def _recommend(action, tickers, amounts, budget, budgets, window, bootstrap):
+    """
+    Runs in a pool process: rank against that process's copy of the market data.
+    :return: (version of the market data ranked against, result); it can differ from the server's during a reload
+    """
+    market_data = get_market_data()
+    return market_data.version, portfolio_recommendations(market_data, action, tickers, amounts, budget, budgets, window, bootstrap)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    try:
+        get_market_data()  # Also builds the artifact if needed, before the workers open it
+    except Exception as e:
+        print("⚠️ Market data not loaded at startup:", e)
+    try:
+        users.collection  # Creates the unique email index before the first registration can race
+    except Exception as e:
+        print("⚠️ Could not connect to MongoDB at startup:", e)
+    app.state.pool = ProcessPoolExecutor(max_workers=COMPUTE_WORKERS, initializer=_init_worker)
+    app.state.slots = asyncio.Semaphore(COMPUTE_QUEUE_LIMIT)
+    yield
+    app.state.pool.shutdown(cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+def error_response(message, status_code):
+    return ORJSONResponse({"error": message}, status_code=status_code)
+
+
+@app.get("/api/ping")
+async def ping():
+    return {"message": "pong"}
+
+
+# Plain (non-async) routes: FastAPI runs them in its thread pool, so bcrypt and Mongo don't block the event loop
+@app.post("/api/register")
+def register(data: dict = Body(...)):
+    try:
+        email = data.get("email")
+        password = data.get("password")
+
+        if not email or not password:
+            return error_response("Email and password required", 400)
+
+        if users.find(email):
+            return error_response("User already exists", 409)
+
+        password_hash = password_hasher.hash(password).result()
+
+        if not users.insert(email, password_hash):
+            return error_response("User already exists", 409)  # Registered concurrently since the check above
+
+        return ORJSONResponse({"message": "User registered successfully!"}, status_code=201)
+
+    except AuthBusyError as e:
+        return error_response(str(e), 429)
+
+    except Exception as e:
+        print("❌ Error in /api/register:", e)
+        traceback.print_exc()
+        return error_response("Internal Server Error", 500)
+
+
+@app.post("/api/login")
+def login(data: dict = Body(...)):
+    try:
+        email = data.get("email")
+        password = data.get("password")
+
+        if not email or not password:
+            return error_response("Email and password required", 400)
+
+        user = users.find(email)
+        if not user:
+            return error_response("User not found", 404)
+
+        if not password_hasher.check(password, user["password_hash"]).result():
+            return error_response("Incorrect password", 401)
+
+        return {"message": "Login successful!"}
+
+    except AuthBusyError as e:
+        return error_response(str(e), 429)
+
+    except Exception as e:
+        print("❌ Error in /api/login:", e)
+        traceback.print_exc()
+        return error_response("Internal Server Error", 500)
+
+
+async def recommend(action, data):
+    """Shared body of /api/buy and /api/sell: validate, then rank in the process pool (or answer from the cache)."""
+    tickers = data.get("tickers", [])
+    amounts = data.get("amounts", [])
+    budget = float(data.get("budget", 0))
+    budgets, error = budget_sweep(data.get("budgets"))  # Optional budget sweep: rank every amount in one pass
+
+    if not tickers or not amounts or len(tickers) != len(amounts):
+        return error_response("Invalid portfolio format", 400)
+    if error:
+        return error_response(error, 400)
+
+    market_data = await run_in_threadpool(get_market_data)  # A reload hashes the CSV (and may rebuild the artifact): off the event loop
+    window, error = parse_window(data, market_data)
+    if error:
+        return error_response(error, 400)
+    # Optional confidence intervals for the top candidates: true or {"resamples": ..., "block_length": ...}
+    bootstrap, error = bootstrap_options(data.get("bootstrap"))
+    if error:
+        return error_response(error, 400)
+
+    def key(version):
+        return portfolio_key(action, tickers, amounts, budgets or budget, version, window=window, bootstrap=bootstrap)
+
+    result = result_cache.get(key(market_data.version), market_data.version)
+    if result is None:
+        if app.state.slots.locked():
+            return error_response("Server busy, try again shortly", 503)
+        async with app.state.slots:
+            version, result = await asyncio.get_running_loop().run_in_executor(
+                app.state.pool, _recommend, action, tickers, amounts, budget, budgets, window, bootstrap
+            )
+        result_cache.put(key(version), result, version)  # Under the version the worker actually ranked against
+    return result
+
+
+@app.post("/api/buy")
+async def recommend_buy(data: dict = Body(...)):
+    try:
+        return await recommend("buy", data)
+    except Exception as e:
+        print("❌ Error in /api/buy:", e)
+        traceback.print_exc()
+        return error_response("Internal Server Error", 500)
+
+
+@app.post("/api/sell")
+async def recommend_sell(data: dict = Body(...)):
+    try:
+        return await recommend("sell", data)
+    except Exception as e:
+        print("❌ Error in /api/sell:", e)
+        traceback.print_exc()
+        return error_response("Internal Server Error", 500)
@@ -0,0 +1,118 @@
+"""
+User store and password hashing shared by the API servers.
+bcrypt runs on a small dedicated executor with a bounded queue, so a login spike can't occupy every
+request worker; past the bound, callers get AuthBusyError and the servers answer 429.
+pymongo is imported and Mongo connected on first use, so importing a server stays fast.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", str(os.cpu_count() or 1)))  # bcrypt releases the GIL, so threads run in parallel
+AUTH_QUEUE_LIMIT = int(os.getenv("AUTH_QUEUE_LIMIT", str(8 * AUTH_WORKERS)))  # Hashes queued or running before 429
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))  # Wait for a free pooled connection
+
+
+class AuthBusyError(Exception):
+    """The password hashing queue is full."""
+
+
+class PasswordHasher:
+    def __init__(self, workers=AUTH_WORKERS, queue_limit=AUTH_QUEUE_LIMIT):
+        """
+        :param workers: Threads running bcrypt
+        :param queue_limit: Hashes allowed in flight (queued or running) before callers are turned away
+        """
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(queue_limit)
+
+    def submit(self, fn, *args):
+        """Run fn on the executor and return its future, or raise AuthBusyError if the queue is full."""
+        if not self._slots.acquire(blocking=False):
+            raise AuthBusyError("Too many authentication requests, try again shortly")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hash(self, password):
+        return self.submit(bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt())
+
+    def check(self, password, password_hash):
+        return self.submit(bcrypt.checkpw, password.encode("utf-8"), password_hash)
+
+
+password_hasher = PasswordHasher()
+
+
+def mongo_client(uri=None):
+    """MongoClient with the pool size and timeouts from the environment."""
+    from pymongo import MongoClient
+
+    return MongoClient(
+        uri or os.getenv("MONGO_URI"),
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    )
+
+
+def ensure_user_indexes(users_collection):
+    """Unique index on email: logins are single-key lookups, and concurrent registrations can't duplicate a user."""
+    users_collection.create_index([("email", 1)], unique=True, name="email_unique")  # 1 = pymongo.ASCENDING
+
+
+class UserStore:
+    def __init__(self, uri=None, db_name=None, collection=None):
+        """
+        The users collection, connected (and indexed) on first use.
+        :param collection: Use this collection instead of connecting, e.g. an in-memory stand-in
+        """
+        self.uri = uri
+        self.db_name = db_name
+        self._collection = collection
+        self._lock = threading.Lock()
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    collection = mongo_client(self.uri)[self.db_name]["users"]
+                    try:
+                        ensure_user_indexes(collection)
+                    except Exception as e:
+                        print("⚠️ Could not create user indexes:", e)
+                    self._collection = collection
+        return self._collection
+
+    def find(self, email):
+        return self.collection.find_one({"email": email})
+
+    def insert(self, email, password_hash):
+        """Add a user. Returns False if the email is already registered (the unique index catches concurrent registrations)."""
+        from pymongo.errors import DuplicateKeyError
+
+        try:
+            self.collection.insert_one({
+                "email": email,
+                "password_hash": password_hash
+            })
+        except DuplicateKeyError:
+            return False
+        return True
@@ -0,0 +1,19 @@
+import os
+
+# gunicorn -c gunicorn.conf.py api_server:app
+# The master publishes the market data artifact before forking; every worker then memory-maps the same
+# read-only files, so the returns, statistics and lookback index live once in the OS page cache however
+# many workers run. Refreshes (misc/append_prices.py, misc/build_market_data.py) publish a new segment
+# and swap the metadata atomically; each worker picks it up on its next reload check.
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+
+
+def on_starting(server):
+    # The app itself isn't preloaded: the Mongo client must be created after the fork
+    from market_data import get_market_data
+    try:
+        market_data = get_market_data()
+        server.log.info("Market data %s ready: %d days x %d tickers", market_data.version, *market_data.returns.shape)
+    except Exception as e:
+        server.log.warning("Market data not published at startup: %s", e)
@@ -0,0 +1,681 @@
+"""
+Process-wide market data store.
+Loads the historical price history once per process and keeps the daily returns
+matrix (optionally memory-mapped from a prebuilt .npy artifact) for every request.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process rebuild lock
+    fcntl = None
+
+CSV_PATH = os.getenv("CSV_PATH", "historical_adjusted_prices.csv")
+ARTIFACT_PATH = os.getenv("MARKET_DATA_PATH", "market_data")  # -> market_data.npy + market_data.json
+RELOAD_CHECK_INTERVAL = float(os.getenv("MARKET_DATA_RELOAD_INTERVAL", "5"))
+STALE_POLICY = os.getenv("MARKET_DATA_STALE_POLICY", "rebuild")  # "rebuild" or "refuse" a stale artifact
+# Compact mode stores the returns and the covariance matrix as float32 (half the memory); sums are still accumulated in float64,
+# and the lookback index (ReturnWindows) stays float64: it is not halved, see misc/validate_compact.py for its footprint
+RETURNS_DTYPE = np.dtype(np.float32 if os.getenv("MARKET_DATA_COMPACT", "0") == "1" else np.float64)
+# Build the lookback index at load (reads every column). Off by default in compact mode, where the float64 index
+# (2 x (days + 1) x tickers plus checkpoints) would outweigh the float32 returns: it is then built by the first windowed request
+WARM_WINDOWS = os.getenv("MARKET_DATA_WARM_WINDOWS", "0" if RETURNS_DTYPE == np.float32 else "1") == "1"
+MOMENTS_CHUNK_ROWS = 1024  # Rows converted to float64 at a time when computing the covariance
+# Factor mode keeps a k-factor model of the covariance (O(N * k)) instead of the dense matrix, for universes of 10k+ tickers
+FACTOR_COUNT = int(os.getenv("MARKET_DATA_FACTORS", "0"))
+
+WINDOW_INDEX_MAX_BYTES = int(os.getenv("WINDOW_INDEX_MAX_BYTES", str(64 * 2 ** 20)))  # Budget for the cross-product checkpoints
+WINDOW_MIN_BLOCK = 21  # Rows between checkpoints at most once a month
+LOOKBACKS = {"1y": 252, "3y": 3 * 252, "5y": 5 * 252, "10y": 10 * 252}
+
+STATS = ("mean", "var", "cov")  # Saved next to the returns as <segment>.<name>.npy
+FACTOR_STATS = ("mean", "var", "loadings", "specific")  # Saved instead of STATS in factor mode
+WINDOW_ARRAYS = ("sums", "squares", "grams")  # The lookback index, saved the same way when WARM_WINDOWS is on
+
+
+class StaleMarketDataError(Exception):
+    """The prebuilt artifact was built from a different version of the price history."""
+
+
+class MarketData:
+    def __init__(self, returns, tickers, dates, prices=None, version=None, last_prices=None):
+        """
+        Read-only view of the market history.
+        :param returns: (days x tickers) matrix of daily returns, float64 or float32 (compact mode)
+        :param tickers: Column labels of the returns matrix
+        :param dates: Date of every returns row
+        :param prices: Optional DataFrame of the adjusted close prices the returns came from
+        :param version: Identifier of the source file the data was loaded from
+        :param last_prices: Adjusted close of every ticker on the last date, the base for appending new days
+        """
+        assert returns.shape == (len(dates), len(tickers)), f"Returns shape {returns.shape} doesn't match {len(dates)} dates x {len(tickers)} tickers!"
+        if returns.flags.writeable:
+            returns.setflags(write=False)
+        self.returns = returns
+        self.tickers = list(tickers)
+        self.index = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.dates = pd.DatetimeIndex(dates)
+        self.prices = prices
+        self.version = version
+        if last_prices is None and prices is not None:
+            last_prices = prices.iloc[-1].to_numpy(dtype=np.float64)
+        self.last_prices = last_prices
+        self._moments = None
+        self._windows = None
+
+    @property
+    def moments(self):
+        """Per-ticker mean/variance and the covariance matrix (or its factor model), computed on first use."""
+        if self._moments is None:
+            if FACTOR_COUNT:
+                self._moments = FactorMoments.from_returns(self.returns, FACTOR_COUNT)
+            else:
+                self._moments = ReturnMoments.from_returns(self.returns)
+        return self._moments
+
+    @property
+    def windows(self):
+        """Prefix-sum index for statistics over any lookback window, built on first use."""
+        if self._windows is None:
+            self._windows = ReturnWindows(self.returns)
+        return self._windows
+
+    def window_rows(self, window=None):
+        """
+        Returns rows [start, end) covered by a window.
+        :param window: None for the full history, a lookback such as "1y"/"3y"/"5y"/"10y",
+                       or {"start": date, "end": date} (either bound may be omitted, end is exclusive)
+        """
+        n_days = len(self.dates)
+        if window is None:
+            return 0, n_days
+        if isinstance(window, str):
+            if window not in LOOKBACKS:
+                raise ValueError(f"Unknown lookback '{window}', expected one of {list(LOOKBACKS)}")
+            return max(n_days - LOOKBACKS[window], 0), n_days
+
+        start = self.dates.searchsorted(pd.Timestamp(window["start"])) if window.get("start") else 0
+        end = self.dates.searchsorted(pd.Timestamp(window["end"])) if window.get("end") else n_days
+        if end - start < 2:
+            raise ValueError("The window must cover at least two trading days")
+        return int(start), int(end)
+
+    def window_moments(self, window=None):
+        """Return moments over a window (see window_rows); the full history uses the precomputed moments."""
+        start, end = self.window_rows(window)
+        if (start, end) == (0, len(self.dates)):
+            return self.moments
+        return self.windows.moments(start, end)
+
+    @classmethod
+    def from_prices(cls, prices, version=None, dtype=RETURNS_DTYPE):
+        """Build the store from a DataFrame of adjusted close prices, keeping the returns as dtype."""
+        stock_returns = prices.pct_change().dropna()
+        returns = np.asfortranarray(stock_returns.to_numpy(dtype=dtype))  # Column-major: one ticker is one contiguous run
+        return cls(returns, prices.columns, stock_returns.index, prices=prices, version=version)
+
+    @classmethod
+    def from_csv(cls, path=CSV_PATH, fingerprint=None, dtype=RETURNS_DTYPE):
+        """Parse the historical prices CSV (slow path, used to build the artifact)."""
+        prices = pd.read_csv(path, index_col="Date", parse_dates=True)
+        return cls.from_prices(prices, version=fingerprint or file_fingerprint(path), dtype=dtype)
+
+    @classmethod
+    def from_artifact(cls, path=ARTIFACT_PATH, mmap_mode="r"):
+        """
+        Open a prebuilt artifact. The returns matrix, the saved statistics and the lookback index are
+        memory-mapped, so opening costs the same whatever the size of the universe, and every process
+        opening the same artifact shares one copy in the OS page cache. The returns are stored column-major,
+        so reading a few tickers' columns only pages in those columns.
+        """
+        meta = read_artifact_meta(path)
+        # Artifacts written before segments existed keep their arrays directly under path
+        prefix = os.path.join(os.path.dirname(path), meta["segment"]) if meta.get("segment") else path
+        returns = np.load(prefix + ".npy", mmap_mode=mmap_mode)
+        last_prices = np.array(meta["last_prices"], dtype=np.float64) if meta.get("last_prices") else None
+        market_data = cls(returns, meta["tickers"], pd.to_datetime(meta["dates"]), version=meta["version"], last_prices=last_prices)
+        stats, moments_class = (FACTOR_STATS, FactorMoments) if meta.get("factors") else (STATS, ReturnMoments)
+        if all(os.path.exists(f"{prefix}.{name}.npy") for name in stats):
+            market_data._moments = moments_class(*(np.load(f"{prefix}.{name}.npy", mmap_mode=mmap_mode) for name in stats))
+        if meta.get("window_block") and all(os.path.exists(f"{prefix}.{name}.npy") for name in WINDOW_ARRAYS):
+            market_data._windows = ReturnWindows.attach(
+                returns, *(np.load(f"{prefix}.{name}.npy", mmap_mode=mmap_mode) for name in WINDOW_ARRAYS), meta["window_block"]
+            )
+        return market_data
+
+    def save_artifact(self, path=ARTIFACT_PATH):
+        """
+        Write the returns matrix, its statistics and the ticker/date index next to each other.
+        The arrays go to a segment named after the data version (see artifact_segment) and the metadata,
+        written last with os.replace, points readers at it: publishing a new version is one atomic rename,
+        and processes still mapping the previous segment keep reading it undisturbed.
+        """
+        self.save_artifact_arrays(path)
+        self.save_artifact_meta(path)
+
+    def save_artifact_arrays(self, path=ARTIFACT_PATH):
+        """Write the returns matrix and the statistics (and the lookback index); they are picked up once the metadata is written."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        segment = artifact_segment(path, self.version, self.returns.dtype, self.factors)
+        arrays = {"": np.asfortranarray(self.returns)}
+        arrays.update({f".{name}": getattr(self.moments, name) for name in (FACTOR_STATS if self.factors else STATS)})
+        if WARM_WINDOWS:
+            arrays.update({f".{name}": getattr(self.windows, name) for name in WINDOW_ARRAYS})
+        for suffix, array in arrays.items():
+            _replace_file(f"{segment}{suffix}.npy", lambda f: np.save(f, np.asarray(array)), "wb")
+
+    def save_artifact_meta(self, path=ARTIFACT_PATH):
+        """Publish the arrays written by save_artifact_arrays, then delete the segments older than the previous one."""
+        meta = {
+            "version": self.version,  # Fingerprint of the source CSV
+            "segment": os.path.basename(artifact_segment(path, self.version, self.returns.dtype, self.factors)),
+            "tickers": self.tickers,
+            "dates": [d.strftime("%Y-%m-%d") for d in self.dates],
+            "shape": list(self.returns.shape),
+            "dtype": self.returns.dtype.name,
+            "window_block": self.windows.block if WARM_WINDOWS else None,
+            "factors": self.factors,
+            "last_prices": None if self.last_prices is None else [float(p) for p in self.last_prices],
+        }
+        previous = read_artifact_meta(path).get("segment") if os.path.exists(path + ".json") else None
+        _replace_file(path + ".json", lambda f: json.dump(meta, f), "w")
+        # Keep the previous segment for readers that read the old metadata just before the swap
+        _remove_segments(path, keep={meta["segment"], previous})
+
+    def extend(self, new_prices, version=None):
+        """
+        Append new days of prices and return the extended MarketData.
+        Only the new returns rows are computed, and the means, variances and covariance matrix are
+        updated with the pairwise (Chan et al.) merge formulas: O(m * N^2) for m new days, independent
+        of the length of the history. A factor model is refitted instead. A loaded lookback index is
+        extended by the new rows (see ReturnWindows.extend).
+        :param new_prices: DataFrame of aligned, forward-filled prices for the new days (see align_price_rows)
+        :param version: Fingerprint of the source the new data comes from
+        """
+        prices = np.vstack([self.last_prices, new_prices.to_numpy(dtype=np.float64)])
+        new_returns = (prices[1:] / prices[:-1] - 1).astype(self.returns.dtype)
+
+        market_data = MarketData(
+            np.asfortranarray(np.concatenate([self.returns, new_returns])),
+            self.tickers,
+            self.dates.append(new_prices.index),
+            prices=None if self.prices is None else pd.concat([self.prices, new_prices]),
+            version=version,
+            last_prices=prices[-1],
+        )
+        if self._windows is not None:
+            market_data._windows = self._windows.extend(market_data.returns)
+
+        old = self.moments
+        if isinstance(old, FactorMoments):
+            # The principal components move with every day: refit them (O(T * N * k), still no N x N matrix)
+            market_data._moments = FactorMoments.from_returns(market_data.returns, old.loadings.shape[1])
+            return market_data
+
+        n_old, n_new = len(self.dates), len(new_returns)
+        n_total = n_old + n_new
+        batch = ReturnMoments.from_returns(new_returns)
+        delta = batch.mean - old.mean
+        cov = (old.cov * n_old + batch.cov * n_new + np.outer(delta, delta) * (n_old * n_new / n_total)) / n_total
+        market_data._moments = ReturnMoments(old.mean + delta * (n_new / n_total), np.diag(cov).copy(), cov.astype(old.cov.dtype))
+        return market_data
+
+    @property
+    def factors(self):
+        """Number of factors of the covariance model, None for the dense covariance matrix."""
+        return self.moments.loadings.shape[1] if isinstance(self.moments, FactorMoments) else None
+
+    def column(self, ticker, rows=slice(None)):
+        """Daily returns of a single ticker."""
+        return self.returns[rows, self.index[ticker]]
+
+    def columns(self, tickers, rows=slice(None)):
+        """Daily returns of several tickers, in the given order."""
+        return self.returns[rows, [self.index[ticker] for ticker in tickers]]
+
+
+class ReturnMoments:
+    def __init__(self, mean, var, cov):
+        """
+        Daily return moments of every ticker.
+        Variances are population variances (ddof=0) to match np.std on the return vectors.
+        :param mean: Mean daily return per ticker
+        :param var: Variance of the daily returns per ticker
+        :param cov: (tickers x tickers) covariance matrix, stored with the dtype of the returns
+        """
+        self.mean = mean
+        self.var = var
+        self.cov = cov
+
+    @classmethod
+    def from_returns(cls, returns):
+        """Moments accumulated in float64 a block of rows at a time, whatever the dtype of the returns."""
+        mean = returns.mean(axis=0, dtype=np.float64)
+        cov = np.zeros((returns.shape[1], returns.shape[1]))
+        for start in range(0, len(returns), MOMENTS_CHUNK_ROWS):
+            centered = np.asarray(returns[start:start + MOMENTS_CHUNK_ROWS], dtype=np.float64) - mean
+            cov += centered.T @ centered
+        cov /= len(returns)
+        return cls(mean, np.diag(cov).copy(), cov.astype(returns.dtype, copy=False))
+
+    def cov_with(self, columns, weights, rows=None):
+        """Covariance of every ticker (or only the tickers in rows) with the portfolio returns[:, columns] @ weights."""
+        # The covariance is symmetric: read whole rows, which are contiguous (and the only pages touched when memory-mapped)
+        if rows is None:
+            return weights @ self.cov[columns]
+        return weights @ self.cov[np.ix_(columns, rows)]
+
+    def cov_rows(self, rows):
+        """(rows x tickers) covariance of the tickers in rows with every ticker, in float64."""
+        return np.asarray(self.cov[rows], dtype=np.float64)
+
+    def cov_with_portfolios(self, weights):
+        """(portfolios x tickers) covariance of every ticker with every row of weights, a full-universe weight matrix."""
+        return weights @ self.cov  # The covariance is symmetric
+
+
+class FactorMoments:
+    def __init__(self, mean, var, loadings, specific):
+        """
+        Same interface as ReturnMoments, with the covariance matrix replaced by a k-factor model:
+        cov ~ loadings @ loadings.T + diag(specific), O(N * k) memory instead of O(N^2).
+        The variances stay exact: specific is what the factors leave of each ticker's variance.
+        :param loadings: (tickers x k) exposure of every ticker to the top principal components, scaled by their std
+        :param specific: Idiosyncratic variance of every ticker
+        """
+        self.mean = mean
+        self.var = var
+        self.loadings = loadings
+        self.specific = specific
+
+    @classmethod
+    def from_returns(cls, returns, k, oversample=10, power_iterations=2, seed=0):
+        """
+        Truncated PCA of the centered returns by randomized SVD (Halko, Martinsson & Tropp), reading the
+        returns a block of rows at a time in float64: a few O(T * N * k) passes, no N x N matrix.
+        """
+        n_days, n_stocks = returns.shape
+        mean = returns.mean(axis=0, dtype=np.float64)
+        k = min(k, n_days, n_stocks)
+        rank = min(k + oversample, n_days, n_stocks)
+
+        def blocks():
+            for start in range(0, n_days, MOMENTS_CHUNK_ROWS):
+                yield start, np.asarray(returns[start:start + MOMENTS_CHUNK_ROWS], dtype=np.float64) - mean
+
+        def times(matrix):  # centered @ matrix, (days x rank)
+            return np.concatenate([chunk @ matrix for _, chunk in blocks()])
+
+        def transposed_times(matrix):  # centered.T @ matrix, (tickers x rank)
+            return sum(chunk.T @ matrix[start:start + len(chunk)] for start, chunk in blocks())
+
+        basis = np.linalg.qr(times(np.random.default_rng(seed).standard_normal((n_stocks, rank))))[0]
+        for _ in range(power_iterations):  # Sharpen the basis towards the top components
+            basis = np.linalg.qr(times(np.linalg.qr(transposed_times(basis))[0]))[0]
+        _, singular_values, components = np.linalg.svd(transposed_times(basis).T, full_matrices=False)
+
+        loadings = components[:k].T * (singular_values[:k] / np.sqrt(n_days))
+        var = sum(np.einsum("ij,ij->j", chunk, chunk) for _, chunk in blocks()) / n_days
+        return cls(mean, var, loadings, np.maximum(var - np.einsum("ij,ij->i", loadings, loadings), 0))
+
+    @property
+    def cov(self):
+        """Dense covariance matrix of the model, O(N^2). Built anew on every access and never kept, so the model stays O(N * k)."""
+        cov = self.loadings @ self.loadings.T
+        cov[np.diag_indices_from(cov)] += self.specific
+        return cov
+
+    def cov_with_portfolios(self, weights):
+        """(portfolios x tickers) covariance of every ticker with every row of weights, a full-universe weight matrix."""
+        return (weights @ self.loadings) @ self.loadings.T + weights * self.specific
+
+    def cov_with(self, columns, weights, rows=None):
+        """Covariance of every ticker (or only the tickers in rows) with the portfolio returns[:, columns] @ weights."""
+        exposure = weights @ self.loadings[columns]
+        specific = np.zeros(len(self.mean))
+        np.add.at(specific, columns, self.specific[columns] * weights)
+        if rows is None:
+            return self.loadings @ exposure + specific
+        return self.loadings[rows] @ exposure + specific[rows]
+
+    def cov_rows(self, rows):
+        """(rows x tickers) covariance of the tickers in rows with every ticker."""
+        rows = np.asarray(rows)
+        block = self.loadings[rows] @ self.loadings.T
+        block[np.arange(len(rows)), rows] += self.specific[rows]
+        return block
+
+
+class ReturnWindows:
+    def __init__(self, returns, max_bytes=WINDOW_INDEX_MAX_BYTES):
+        """
+        Cumulative sums of the returns and their squares for every row, plus cumulative cross-product
+        matrices (returns.T @ returns) at evenly spaced checkpoints. The checkpoint spacing is chosen so
+        the matrices fit in max_bytes; with no room for any, windows fall back to the raw rows.
+        The index is float64 in compact mode too, (T + 1) x N twice plus the checkpoints: a window's statistics
+        are differences of two running totals over the whole history, so float32 totals would lose digits in
+        proportion to history / window length (a 1-month window of 30 years ~ 360x the float32 rounding).
+        """
+        n_days, n_stocks = returns.shape
+        self.returns = returns
+
+        self.sums = np.zeros((n_days + 1, n_stocks))
+        np.cumsum(returns, axis=0, dtype=np.float64, out=self.sums[1:])
+        self.squares = np.zeros((n_days + 1, n_stocks))
+        np.cumsum(np.square(returns, dtype=np.float64), axis=0, out=self.squares[1:])
+
+        n_checkpoints = min(max_bytes // (8 * n_stocks * n_stocks) - 1, n_days // WINDOW_MIN_BLOCK)
+        self.block = -(-n_days // n_checkpoints) if n_checkpoints > 0 else n_days + 1
+        # Without checkpoints only the empty prefix is kept, not an N x N matrix of zeros
+        self.grams = np.zeros((n_days // self.block + 1, n_stocks, n_stocks) if n_checkpoints > 0 else (1, 0, 0))
+        for k in range(1, len(self.grams)):
+            chunk = np.asarray(returns[(k - 1) * self.block:k * self.block], dtype=np.float64)
+            self.grams[k] = self.grams[k - 1] + chunk.T @ chunk
+
+    def extend(self, returns):
+        """
+        Index of returns, whose first rows are the ones indexed here: only the new rows are summed and only
+        the checkpoints they complete are added, at the same spacing (O(m * N) plus O(block * N^2) per new
+        checkpoint), instead of reindexing the whole history. Appended checkpoints can outgrow max_bytes;
+        a full rebuild respaces them.
+        """
+        n_old, n_days = len(self.sums) - 1, len(returns)
+        new_rows = np.asarray(returns[n_old:], dtype=np.float64)
+        sums = np.concatenate([self.sums, self.sums[-1] + np.cumsum(new_rows, axis=0)])
+        squares = np.concatenate([self.squares, self.squares[-1] + np.cumsum(np.square(new_rows), axis=0)])
+
+        if self.grams.shape[1] == 0:  # No room for checkpoints: keep windows on the raw rows
+            return ReturnWindows.attach(returns, sums, squares, self.grams, max(self.block, n_days + 1))
+        grams = [np.asarray(self.grams[-1])]
+        for k in range(len(self.grams), n_days // self.block + 1):
+            chunk = np.asarray(returns[(k - 1) * self.block:k * self.block], dtype=np.float64)
+            grams.append(grams[-1] + chunk.T @ chunk)
+        grams = np.concatenate([self.grams, np.stack(grams[1:])]) if len(grams) > 1 else self.grams
+        return ReturnWindows.attach(returns, sums, squares, grams, self.block)
+
+    @classmethod
+    def attach(cls, returns, sums, squares, grams, block):
+        """Wrap a prebuilt index (e.g. memory-mapped from the artifact) instead of computing one."""
+        windows = cls.__new__(cls)
+        windows.returns, windows.sums, windows.squares, windows.grams, windows.block = returns, sums, squares, grams, block
+        return windows
+
+    def moments(self, start, end):
+        return WindowMoments(self, start, end)
+
+    def _split(self, start, end):
+        """Checkpoints bounding the window's whole blocks, and the leftover row ranges at its edges."""
+        first, last = -(-start // self.block), end // self.block
+        if first >= last:
+            return None, [(start, end)]
+        return (first, last), [(start, first * self.block), (last * self.block, end)]
+
+    def cross(self, start, end, columns, weights, rows=None):
+        """Sum over rows [start, end) of returns[:, rows] * (returns[:, columns] @ weights)."""
+        checkpoints, edges = self._split(start, end)
+        rows = slice(None) if rows is None else np.asarray(rows)
+        total = 0.0
+        if checkpoints is not None:
+            block = np.ix_(rows, columns) if isinstance(rows, np.ndarray) else (rows, columns)
+            first, last = checkpoints
+            total = self.grams[last][block] @ weights - self.grams[first][block] @ weights
+        for lo, hi in edges:
+            if hi > lo:
+                chunk = np.asarray(self.returns[lo:hi], dtype=np.float64)
+                total = total + chunk[:, rows].T @ (chunk[:, columns] @ weights)
+        return total
+
+    def cross_rows(self, start, end, rows):
+        """returns[start:end, rows].T @ returns[start:end]."""
+        checkpoints, edges = self._split(start, end)
+        total = self.grams[checkpoints[1]][rows] - self.grams[checkpoints[0]][rows] if checkpoints is not None else 0.0
+        for lo, hi in edges:
+            if hi > lo:
+                chunk = np.asarray(self.returns[lo:hi], dtype=np.float64)
+                total = total + chunk[:, rows].T @ chunk
+        return total
+
+    def cross_matrix(self, start, end):
+        """returns[start:end].T @ returns[start:end]."""
+        checkpoints, edges = self._split(start, end)
+        total = self.grams[checkpoints[1]] - self.grams[checkpoints[0]] if checkpoints is not None else 0.0
+        for lo, hi in edges:
+            if hi > lo:
+                chunk = np.asarray(self.returns[lo:hi], dtype=np.float64)
+                total = total + chunk.T @ chunk
+        return total
+
+
+class WindowMoments:
+    def __init__(self, windows, start, end):
+        """Same interface as ReturnMoments, for the returns rows [start, end), read from the prefix sums."""
+        self.windows = windows
+        self.start, self.end = start, end
+        n_days = end - start
+        self.mean = (windows.sums[end] - windows.sums[start]) / n_days
+        self.var = np.maximum((windows.squares[end] - windows.squares[start]) / n_days - self.mean ** 2, 0)
+        self._cov = None
+
+    @property
+    def cov(self):
+        """Full covariance matrix of the window, built on first use."""
+        if self._cov is None:
+            self._cov = self.windows.cross_matrix(self.start, self.end) / (self.end - self.start) - np.outer(self.mean, self.mean)
+        return self._cov
+
+    def cov_with(self, columns, weights, rows=None):
+        """Covariance of every ticker (or only the tickers in rows) with the portfolio returns[:, columns] @ weights."""
+        cross = self.windows.cross(self.start, self.end, columns, weights, rows)
+        mean_rows = self.mean if rows is None else self.mean[rows]
+        return cross / (self.end - self.start) - mean_rows * (self.mean[columns] @ weights)
+
+    def cov_with_portfolios(self, weights):
+        """
+        (portfolios x tickers) covariance of every ticker with every row of weights, a full-universe weight matrix.
+        Only the held columns are read from the cross products, so no N x N window covariance is built.
+        """
+        columns = np.flatnonzero(weights.any(axis=0))
+        held = weights[:, columns]
+        if self._cov is not None:
+            return held @ self._cov[columns]
+        cross = self.windows.cross(self.start, self.end, columns, held.T)  # (tickers x portfolios)
+        return cross.T / (self.end - self.start) - np.outer(held @ self.mean[columns], self.mean)
+
+    def cov_rows(self, rows):
+        """(rows x tickers) covariance of the tickers in rows with every ticker."""
+        if self._cov is not None:
+            return self._cov[rows]
+        return self.windows.cross_rows(self.start, self.end, rows) / (self.end - self.start) - np.outer(self.mean[rows], self.mean)
+
+
+def align_price_rows(market_data, delta):
+    """
+    Apply the download_data.py cleaning rules to newly downloaded prices only: business-day calendar
+    and forward-fill from the last stored prices. Days already stored are ignored, tickers outside the
+    universe are dropped (adding tickers needs a full rebuild).
+    :param delta: DataFrame of adjusted close prices indexed by date
+    :return: DataFrame of the new days, one column per ticker of market_data
+    """
+    last_date = market_data.dates[-1]
+    delta = delta[delta.index > last_date]
+    if delta.empty:
+        return delta.reindex(columns=market_data.tickers)
+
+    unknown = [stock for stock in delta.columns if stock not in market_data.index]
+    if unknown:
+        print("Ignoring tickers outside the universe:", unknown)
+    missing = [stock for stock in market_data.tickers if stock not in delta.columns]
+    if missing:
+        print("No new prices, forward-filling:", missing)
+
+    full_date_range = pd.date_range(start=last_date, end=delta.index.max(), freq="B")
+    aligned = delta.reindex(columns=market_data.tickers).reindex(full_date_range)
+    aligned.iloc[0] = market_data.last_prices
+    aligned = aligned.ffill().iloc[1:]
+    aligned.index.name = "Date"
+    return aligned
+
+
+def _replace_file(path, write, mode):
+    """Write a file under a temporary name, then atomically move it into place."""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, mode) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def artifact_segment(path, version, dtype, factors=None):
+    """Path prefix of the arrays of one published version of the artifact: <path>.<version>-<dtype>[-k<factors>]."""
+    return f"{path}.{(version or 'unversioned')[:16]}-{np.dtype(dtype).name}" + (f"-k{factors}" if factors else "")
+
+
+def _remove_segments(path, keep):
+    """Delete the artifact arrays of every segment not in keep (and those of the unsegmented layout)."""
+    directory, base = os.path.split(os.path.abspath(path))
+    pattern = re.compile(re.escape(base) + r"(\.[0-9a-z]+-float(?:32|64)(?:-k[0-9]+)?)?(?:\.(?:" + "|".join(dict.fromkeys(STATS + FACTOR_STATS + WINDOW_ARRAYS)) + r"))?\.npy")
+    for name in os.listdir(directory):
+        match = pattern.fullmatch(name)
+        if match and (match.group(1) and base + match.group(1)) not in keep:
+            try:
+                os.remove(os.path.join(directory, name))  # Processes mapping the file keep their pages until they unmap it
+            except OSError as e:
+                print("⚠️ Could not remove old market data segment:", e)
+
+
+@contextlib.contextmanager
+def _artifact_lock(path):
+    """Exclusive lock across processes (e.g. gunicorn workers), so only one of them rebuilds the artifact."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)  # The lock file lives next to the artifact
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_artifact_meta(path=ARTIFACT_PATH):
+    with open(path + ".json") as f:
+        return json.load(f)
+
+
+def artifact_matches(path, fingerprint):
+    """Whether the artifact at path was built from the CSV with this fingerprint, in the current dtype and factor mode."""
+    if not os.path.exists(path + ".json"):
+        return False
+    meta = read_artifact_meta(path)
+    # Artifacts written before compact (or factor) mode existed have no dtype: they are float64 (and dense)
+    return (meta["version"] == fingerprint and meta.get("dtype", "float64") == RETURNS_DTYPE.name
+            and meta.get("factors") == (FACTOR_COUNT or None))
+
+
+def file_fingerprint(path):
+    """SHA-256 of the file contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+class MarketDataStore:
+    def __init__(self, csv_path=CSV_PATH, artifact_path=ARTIFACT_PATH, check_interval=RELOAD_CHECK_INTERVAL,
+                 stale_policy=STALE_POLICY):
+        """
+        Hold the current MarketData and swap in a new one when the source changes.
+        The prebuilt artifact is served when its fingerprint matches the CSV; a stale artifact
+        is rebuilt from the CSV or refused, depending on stale_policy.
+        """
+        self.csv_path = csv_path
+        self.artifact_path = artifact_path
+        self.check_interval = check_interval
+        self.stale_policy = stale_policy
+        self._lock = threading.Lock()
+        self._data = None
+        self._stamp = None
+        self._last_check = 0.0
+
+    def _stamps(self):
+        return tuple(
+            _file_stamp(path) if os.path.exists(path) else None
+            for path in (self.artifact_path + ".json", self.csv_path)
+        )
+
+    def _load(self):
+        if not os.path.exists(self.csv_path):
+            return MarketData.from_artifact(self.artifact_path)  # Nothing to check the fingerprint against
+
+        fingerprint = file_fingerprint(self.csv_path)
+        if artifact_matches(self.artifact_path, fingerprint):
+            return MarketData.from_artifact(self.artifact_path)
+        if os.path.exists(self.artifact_path + ".json"):
+            if self.stale_policy == "refuse":
+                raise StaleMarketDataError(f"'{self.artifact_path}' doesn't match '{self.csv_path}' ({RETURNS_DTYPE.name}, {FACTOR_COUNT or 'no'} factors), rebuild it with misc/build_market_data.py")
+            print("⚠️ Market data artifact is stale, rebuilding it from", self.csv_path)
+        elif self.stale_policy == "refuse":
+            return MarketData.from_csv(self.csv_path, fingerprint)
+
+        market_data = None
+        try:
+            with _artifact_lock(self.artifact_path):
+                # Another process may have published the rebuilt artifact while this one waited for the lock
+                if not artifact_matches(self.artifact_path, fingerprint):
+                    market_data = MarketData.from_csv(self.csv_path, fingerprint)
+                    market_data.save_artifact(self.artifact_path)
+        except OSError as e:
+            print("⚠️ Could not save the market data artifact:", e)
+            return market_data if market_data is not None else MarketData.from_csv(self.csv_path, fingerprint)
+        return MarketData.from_artifact(self.artifact_path)
+
+    def get(self):
+        """Return the current data, reloading it first if the source files changed."""
+        data = self._data
+        if data is not None and time.monotonic() - self._last_check < self.check_interval:
+            return data
+
+        with self._lock:
+            self._last_check = time.monotonic()
+            if self._data is None or self._stamps() != self._stamp:
+                try:
+                    new_data = self._load()
+                    new_data.moments  # Warm the moments before the swap so no request pays for them
+                    if WARM_WINDOWS:
+                        new_data.windows
+                except Exception as e:
+                    if self._data is None:
+                        raise
+                    # Keep serving the old data (the file may still be mid-write)
+                    print("⚠️ Market data reload failed, keeping the loaded version:", e)
+                else:
+                    # Single reference swap: requests already holding the old object keep using it
+                    self._data = new_data
+                    # Stamped after loading, so an artifact rebuilt by _load doesn't trigger another reload
+                    self._stamp = self._stamps()
+            return self._data
+
+
+_store = MarketDataStore()
+
+
+def get_market_data():
+    """Return the process-wide market data, loading it on first use."""
+    return _store.get()
@@ -0,0 +1,47 @@
+import os
+import shutil
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data import ARTIFACT_PATH, CSV_PATH, MarketData, align_price_rows, artifact_matches, file_fingerprint
+
+# Append a daily delta file (same layout as historical_adjusted_prices.csv, only the new days)
+# instead of re-downloading ten years: python misc/append_prices.py new_prices.csv
+if len(sys.argv) != 2:
+    sys.exit("Usage: python misc/append_prices.py new_prices.csv")
+delta_path = sys.argv[1]
+
+# The artifact is reused only if it matches the CSV and the current MARKET_DATA_COMPACT/MARKET_DATA_FACTORS settings
+if artifact_matches(ARTIFACT_PATH, file_fingerprint(CSV_PATH)):
+    market_data = MarketData.from_artifact(ARTIFACT_PATH)
+else:
+    print("Artifact missing, stale or built in another dtype/factor mode, building it from", CSV_PATH)
+    market_data = MarketData.from_csv(CSV_PATH)
+
+if market_data.last_prices is None:
+    print("Artifact has no last prices (built by an older version), rebuilding it from", CSV_PATH)
+    market_data = MarketData.from_csv(CSV_PATH)
+
+new_prices = align_price_rows(market_data, pd.read_csv(delta_path, index_col="Date", parse_dates=True))
+if new_prices.empty:
+    print("No new days to append.")
+    sys.exit(0)
+
+# Write the extended CSV next to the old one first, so its fingerprint is known before anything is replaced
+csv_tmp = f"{CSV_PATH}.tmp{os.getpid()}"
+shutil.copyfile(CSV_PATH, csv_tmp)
+new_prices.to_csv(csv_tmp, mode="a", header=False)
+
+extended = market_data.extend(new_prices, version=file_fingerprint(csv_tmp))
+
+# Arrays first, then the CSV, then the metadata: a server checking in between only sees a stale
+# artifact (and rebuilds it), never metadata that claims a CSV which isn't in place yet
+extended.save_artifact_arrays(ARTIFACT_PATH)
+os.replace(csv_tmp, CSV_PATH)
+extended.save_artifact_meta(ARTIFACT_PATH)
+
+print(f"Appended {len(new_prices)} days ({new_prices.index.min().date()} to {new_prices.index.max().date()}).")
+print(f"Source fingerprint: {extended.version}")
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongo_stand_in import MemoryUsers, stand_in_environment
+
+# Login throughput under concurrency, against an in-memory stand-in for the users collection (no Mongo needed):
+# python misc/auth_load_test.py [requests per level] [concurrency levels...]
+# Requests beyond AUTH_QUEUE_LIMIT in flight are answered 429 instead of queueing on the request threads.
+for name, value in stand_in_environment("load_test").items():
+    os.environ.setdefault(name, value)
+os.environ.setdefault("MARKET_DATA_PRELOAD", "off")  # Logins only
+
+import api_server
+from auth import UserStore
+
+n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+levels = [int(level) for level in sys.argv[2:]] or [1, 4, 16, 64]
+
+users = MemoryUsers()
+password_hash = bcrypt.hashpw(b"password", bcrypt.gensalt())  # Default cost, as in production
+for i in range(n_requests):
+    users.insert_one({"email": f"user{i}@example.com", "password_hash": password_hash})
+api_server.users = UserStore(collection=users)
+
+client = api_server.app.test_client()
+
+
+def login(i):
+    start = time.perf_counter()
+    response = client.post("/api/login", json={"email": f"user{i}@example.com", "password": "password"})
+    return response.status_code, time.perf_counter() - start
+
+
+print(f"{'concurrency':>11} {'req/s':>8} {'ok':>6} {'429':>6} {'other':>6} {'p50 ms':>8} {'p95 ms':>8}")
+for concurrency in levels:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(login, range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    statuses = [status for status, _ in results]
+    latencies = sorted(latency for status, latency in results if status == 200)
+    percentile = lambda q: 1000 * latencies[min(int(q * len(latencies)), len(latencies) - 1)] if latencies else float("nan")
+    print(f"{concurrency:>11} {n_requests / elapsed:>8.1f} {statuses.count(200):>6} {statuses.count(429):>6} "
+          f"{len(statuses) - statuses.count(200) - statuses.count(429):>6} {percentile(0.5):>8.1f} {percentile(0.95):>8.1f}")
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from portfolio_manager import PortfolioManager
+from synthetic_data import synthetic_market_data
+
+# Times the PortfolioManager hot paths on synthetic universes and records peak memory, e.g.
+#   python misc/benchmark_portfolio_manager.py --tickers 100 1000 10000 --days 2520 10000 --output bench.json
+#   python misc/benchmark_portfolio_manager.py --compare bench.json   (same grid, prints the ratio to the old run)
+# "market_data" is the one-off cost of the moments (paid at startup, not per request); every other stage runs per request.
+
+
+def measure(fn, repeat):
+    """Wall times of repeat calls (seconds), then the peak traced allocation of one more call (bytes)."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"min_s": min(times), "median_s": statistics.median(times), "peak_bytes": peak}
+
+
+def run_case(n_tickers, n_days, n_holdings, amount, repeat, dtype):
+    market_data = synthetic_market_data(n_tickers, n_days, dtype=dtype)
+    tickers = list(market_data.tickers[:n_holdings])
+    amounts = [10000.0] * len(tickers)
+
+    def build_moments():
+        market_data._moments = None
+        market_data.moments
+
+    def new_manager():
+        return PortfolioManager(list(tickers), list(amounts), market_data)
+
+    pm = new_manager()
+    stages = {
+        "market_data": build_moments,
+        "__init__": new_manager,
+        "update_rolling_returns": pm.update_rolling_returns,
+        "rank_stocks_for_buying": lambda: pm.rank_stocks_for_buying(amount),
+        "rank_stocks_for_sell": lambda: pm.rank_stocks_for_sell(amount),
+        "buy_stock": lambda: pm.buy_stock(market_data.tickers[-1], amount),
+        "sell_stock": lambda: pm.sell_stock(tickers[0], amount),
+    }
+    results = {}
+    for name, fn in stages.items():
+        results[name] = measure(fn, 1 if name == "market_data" else repeat)
+        print(f"{n_tickers:>7} x {n_days:>6}  {name:<24} {1000 * results[name]['median_s']:>10.3f} ms"
+              f"  {results[name]['peak_bytes'] / 2 ** 20:>9.1f} MiB")
+    return {"tickers": n_tickers, "days": n_days, "dtype": np.dtype(dtype).name, "holdings": len(tickers), "amount": amount,
+            "stages": results}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "machine": platform.machine(), "cpus": os.cpu_count(), "commit": commit}
+
+
+parser = argparse.ArgumentParser(description="Benchmark PortfolioManager hot paths on synthetic data")
+parser.add_argument("--tickers", type=int, nargs="+", default=[100, 1000])
+parser.add_argument("--days", type=int, nargs="+", default=[2520])
+parser.add_argument("--holdings", type=int, default=20, help="Tickers held in the benchmark portfolio")
+parser.add_argument("--amount", type=float, default=1000.0, help="Buy/sell amount")
+parser.add_argument("--repeat", type=int, default=5)
+parser.add_argument("--dtype", choices=["float64", "float32"], default="float64", help="float32 is the compact mode")
+parser.add_argument("--output", help="Write the results as JSON to this path")
+parser.add_argument("--compare", help="Earlier JSON results: reuse its grid and print new/old median ratios")
+args = parser.parse_args()
+
+baseline = None
+if args.compare:
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    grid = [(case["tickers"], case["days"]) for case in baseline["cases"]]
+else:
+    grid = [(n_tickers, n_days) for n_days in args.days for n_tickers in args.tickers]
+
+run = {"environment": environment(), "cases": [run_case(n, t, args.holdings, args.amount, args.repeat, args.dtype) for n, t in grid]}
+
+if baseline:
+    print("\nRatio to", args.compare, "(median time, > 1 is slower)")
+    for old, new in zip(baseline["cases"], run["cases"]):
+        for name, stage in new["stages"].items():
+            if name in old["stages"] and old["stages"][name]["median_s"] > 0:
+                print(f"{new['tickers']:>7} x {new['days']:>6}  {name:<24} {stage['median_s'] / old['stages'][name]['median_s']:>8.2f}")
+
+if args.output:
+    with open(args.output, "w") as f:
+        json.dump(run, f, indent=2)
+    print("Saved results to", args.output)
@@ -0,0 +1,15 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data import ARTIFACT_PATH, CSV_PATH, MarketData
+
+# Parse the historical prices once and save the returns matrix, the per-asset means/variances and the
+# covariance matrix as memory-mappable artifacts, tagged with the SHA-256 of the source CSV.
+# The API server picks up the new artifact on its next reload check, no restart needed.
+market_data = MarketData.from_csv(CSV_PATH)
+market_data.save_artifact(ARTIFACT_PATH)
+
+print(f"Saved {market_data.returns.shape[0]} days x {market_data.returns.shape[1]} tickers to '{ARTIFACT_PATH}.*.npy'.")
+print(f"Source fingerprint: {market_data.version}")
@@ -0,0 +1,97 @@
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from market_data import MarketData
+from mongo_stand_in import stand_in_environment
+from synthetic_data import synthetic_prices
+
+# Cold start budgets for api_server, measured in fresh processes (exits with status 1 when one is exceeded):
+#   import:         `import api_server` with the preload off (median of --repeat runs)
+#   first response: process start to the first /api/ping answer
+#   ready:          process start to /api/ready answering 200 (market data loaded and warm)
+# Runs against a synthetic universe with a prebuilt artifact, as deployed: python misc/check_cold_start.py
+
+parser = argparse.ArgumentParser(description="Check api_server import time and time to first response")
+parser.add_argument("--import-budget", type=float, default=0.6, help="Seconds")
+parser.add_argument("--first-response-budget", type=float, default=1.5, help="Seconds")
+parser.add_argument("--ready-budget", type=float, default=10.0, help="Seconds")
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument("--tickers", type=int, default=500)
+parser.add_argument("--days", type=int, default=2520)
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp(prefix="cold_start_")
+csv_path = os.path.join(workdir, "historical_adjusted_prices.csv")
+synthetic_prices(args.tickers, args.days).to_csv(csv_path)
+MarketData.from_csv(csv_path).save_artifact(os.path.join(workdir, "market_data"))
+
+env = dict(os.environ, PYTHONPATH=REPO, CSV_PATH=csv_path, MARKET_DATA_PATH=os.path.join(workdir, "market_data"),
+           **stand_in_environment("cold_start"))
+
+import_times = []
+for _ in range(args.repeat):
+    output = subprocess.run(
+        [sys.executable, "-c", "import time; start = time.perf_counter(); import api_server; print(time.perf_counter() - start)"],
+        env=dict(env, MARKET_DATA_PRELOAD="off"), cwd=workdir, capture_output=True, text=True, check=True,
+    ).stdout
+    import_times.append(float(output.strip().splitlines()[-1]))
+import_time = statistics.median(import_times)
+
+with socket.socket() as s:
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+
+
+def status(path):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+start = time.perf_counter()
+server = subprocess.Popen(
+    [sys.executable, "-c", f"import api_server; api_server.app.run(port={port}, threaded=True)"],
+    env=env, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+)
+first_response = ready = None
+try:
+    while time.perf_counter() - start < max(args.first_response_budget, args.ready_budget) * 3:
+        if first_response is None and status("/api/ping") == 200:
+            first_response = time.perf_counter() - start
+        if first_response is not None and status("/api/ready") == 200:
+            ready = time.perf_counter() - start
+            break
+        time.sleep(0.01)
+finally:
+    server.terminate()
+    server.wait()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+results = [
+    ("import api_server", import_time, args.import_budget),
+    ("first response", first_response, args.first_response_budget),
+    ("ready", ready, args.ready_budget),
+]
+failed = False
+for name, seconds, budget in results:
+    ok = seconds is not None and seconds <= budget
+    failed |= not ok
+    measured = "never" if seconds is None else f"{seconds:.3f} s"
+    print(f"{'✅' if ok else '❌'} {name:<18} {measured:>10}  (budget {budget:.3f} s)")
+sys.exit(1 if failed else 0)
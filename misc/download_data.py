@@ -1,6 +1,13 @@
+import os
+import sys
+
 import pandas as pd
 import yfinance as yf
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data import ARTIFACT_PATH, MarketData, file_fingerprint
+
 
 # Define the list of stock tickers
 
@@ -79,3 +86,9 @@ adj_close.to_csv("historical_adjusted_prices.csv", index=True)
 
 print("Downloaded and cleaned data for columns:", adj_close.columns)
 print(f"Number of records: {len(adj_close)} (should be the same for all valid stocks)")
+
+# Save the columnar, memory-mappable copy the server loads: every ticker's returns are one contiguous
+# column, so the server can open just the tickers it needs without parsing or reading the rest
+market_data = MarketData.from_prices(adj_close, version=file_fingerprint("historical_adjusted_prices.csv"))
+market_data.save_artifact(ARTIFACT_PATH)
+print(f"Saved columnar market data to '{ARTIFACT_PATH}.npy'.")
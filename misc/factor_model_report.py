@@ -0,0 +1,89 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data import CSV_PATH, FactorMoments, MarketData
+from portfolio_manager import PortfolioManager
+from synthetic_data import synthetic_returns, synthetic_tickers
+
+# Accuracy of factor mode (MARKET_DATA_FACTORS=k: covariance from k principal components plus idiosyncratic
+# variances) against the exact covariance, for each k: python misc/factor_model_report.py [--factors 5 10 20 40]
+# Uses historical_adjusted_prices.csv when present, else a synthetic universe with a few sector factors.
+# Reports memory, fit time, covariance error, portfolio std error and how well the buy/sell rankings agree.
+
+parser = argparse.ArgumentParser(description="Compare factor-model moments against the exact covariance")
+parser.add_argument("--factors", type=int, nargs="+", default=[5, 10, 20, 40])
+parser.add_argument("--portfolios", type=int, default=100)
+parser.add_argument("--budget", type=float, default=1000)
+parser.add_argument("--tickers", type=int, default=550, help="Synthetic universe size, when there is no CSV")
+parser.add_argument("--days", type=int, default=2520, help="Synthetic history length, when there is no CSV")
+args = parser.parse_args()
+
+if os.path.exists(CSV_PATH):
+    exact = MarketData.from_prices(pd.read_csv(CSV_PATH, index_col="Date", parse_dates=True), dtype=np.float64)
+else:
+    rng = np.random.default_rng(1)
+    sectors = rng.normal(0, 0.006, (args.days, 10))[:, rng.integers(0, 10, args.tickers)]  # On top of the market factor
+    returns = synthetic_returns(args.tickers, args.days) + sectors
+    exact = MarketData(np.asfortranarray(returns), synthetic_tickers(args.tickers), pd.bdate_range("2010-01-01", periods=args.days))
+
+n_days, n_stocks = exact.returns.shape
+start = time.perf_counter()
+exact.moments
+exact_seconds = time.perf_counter() - start
+print(f"{n_days} days x {n_stocks} tickers: exact covariance {exact.moments.cov.nbytes / 2 ** 20:.1f} MiB, built in {exact_seconds:.2f} s")
+
+rng = np.random.default_rng(1)
+portfolios = []
+for _ in range(args.portfolios):
+    held = list(rng.choice(exact.tickers, size=rng.integers(1, 30), replace=False))
+    portfolios.append((held, list(rng.uniform(500, 20000, len(held)))))
+
+print(f"{'k':>4} {'MiB':>7} {'fit s':>7} {'cov err':>9} {'std err':>9} {'buy top1':>9} {'buy top5':>9} {'sell top1':>10} {'sharpe err':>11}")
+for k in args.factors:
+    start = time.perf_counter()
+    moments = FactorMoments.from_returns(exact.returns, k)
+    fit_seconds = time.perf_counter() - start
+    model = MarketData(exact.returns, exact.tickers, exact.dates)
+    model._moments = moments
+    model_mib = (moments.loadings.nbytes + moments.specific.nbytes) / 2 ** 20
+
+    # Relative Frobenius error of the covariance, off the diagonal (the diagonal is exact by construction)
+    difference = moments.cov - exact.moments.cov
+    np.fill_diagonal(difference, 0)
+    cov_error = np.linalg.norm(difference) / np.linalg.norm(exact.moments.cov)
+
+    std_errors, sharpe_errors = [], []
+    buy_top1 = buy_top5 = sell_top1 = 0
+    for held, amounts in portfolios:
+        pm_exact = PortfolioManager(list(held), list(amounts), exact)
+        pm_model = PortfolioManager(list(held), list(amounts), model)
+        std_errors.append(abs(pm_model.portfolio_volatility / pm_exact.portfolio_volatility - 1))
+
+        buys = [pm.rank_stocks_for_buying(args.budget) for pm in (pm_exact, pm_model)]
+        buy_top1 += buys[0][0][0] == buys[1][0][0]
+        buy_top5 += len({t[0] for t in buys[0]} & {t[0] for t in buys[1]}) / len(buys[0])
+        sells = [pm.rank_stocks_for_sell(args.budget) for pm in (pm_exact, pm_model)]
+        sell_top1 += bool(sells[0]) and bool(sells[1]) and sells[0][0][0] == sells[1][0][0] or not sells[0] and not sells[1]
+
+        # Sharpe the model gives the exact best candidate, against its exact Sharpe
+        best = buys[0][0][0]
+        column = [exact.index[best]]
+        mean, variance, cov_with_portfolio = pm_model._portfolio_moments()
+        w = args.budget / (pm_model.portfolio_value + args.budget)
+        sharpe = pm_model._blended_metrics(1 - w, w, column, mean, variance, cov_with_portfolio[column])[0][0]
+        sharpe_errors.append(abs(sharpe - buys[0][0][1]))
+
+    n = len(portfolios)
+    print(f"{k:>4} {model_mib:>7.2f} {fit_seconds:>7.2f} {cov_error:>9.2e} {max(std_errors):>9.2e} {buy_top1 / n:>9.0%}"
+          f" {buy_top5 / n:>9.0%} {sell_top1 / n:>10.0%} {max(sharpe_errors):>11.2e}")
+
+print("cov err: off-diagonal relative Frobenius error; std err: worst relative error of the portfolio std;")
+print("buy/sell top1: portfolios whose best candidate matches; buy top5: overlap of the top 5; sharpe err: worst absolute")
+print("error of the best candidate's Sharpe")
@@ -0,0 +1,149 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import bcrypt
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongo_stand_in import MemoryUsers, stand_in_environment
+from synthetic_data import synthetic_prices
+
+# End-to-end load test of api_server.app, self-contained: a synthetic historical_adjusted_prices.csv in a temp
+# directory, an in-memory users collection instead of Mongo, and the app on a local threaded HTTP server.
+#   python misc/load_test.py --clients 32 --requests 5000 --mix ping=1,login=1,buy=4,sell=4
+# Reports throughput and p50/p95/p99 latency and error rate per route.
+
+parser = argparse.ArgumentParser(description="Load test the Flask API with local stand-ins")
+parser.add_argument("--clients", type=int, default=16, help="Concurrent clients, one keep-alive connection each")
+parser.add_argument("--requests", type=int, default=2000, help="Total requests across all clients")
+parser.add_argument("--mix", default="ping=1,login=1,buy=4,sell=4", help="Relative weight of each route")
+parser.add_argument("--tickers", type=int, default=500, help="Tickers in the synthetic universe")
+parser.add_argument("--days", type=int, default=2520, help="Trading days in the synthetic universe")
+parser.add_argument("--holdings", default="5-30", help="Portfolio size range, min-max")
+parser.add_argument("--portfolios", type=int, default=1000, help="Distinct portfolios replayed (fewer means more cache hits)")
+parser.add_argument("--users", type=int, default=100, help="Users registered in the stand-in")
+parser.add_argument("--output", help="Write the report as JSON to this path")
+args = parser.parse_args()
+
+mix = {route: float(weight) for route, weight in (item.split("=") for item in args.mix.split(","))}
+min_holdings, max_holdings = (int(n) for n in args.holdings.split("-"))
+
+# Synthetic prices: one-factor returns, compounded from 100
+workdir = tempfile.mkdtemp(prefix="load_test_")
+prices = synthetic_prices(args.tickers, args.days)
+tickers = list(prices.columns)
+prices.to_csv(os.path.join(workdir, "historical_adjusted_prices.csv"))
+
+# Before anything imports market_data, which reads these when it is imported
+os.environ["CSV_PATH"] = os.path.join(workdir, "historical_adjusted_prices.csv")
+os.environ["MARKET_DATA_PATH"] = os.path.join(workdir, "market_data")
+for name, value in stand_in_environment("load_test").items():
+    os.environ.setdefault(name, value)
+
+import api_server
+from auth import UserStore
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+users = MemoryUsers()
+password_hash = bcrypt.hashpw(b"password", bcrypt.gensalt())  # Default cost, as in production
+for i in range(args.users):
+    users.insert_one({"email": f"user{i}@example.com", "password_hash": password_hash})
+api_server.users = UserStore(collection=users)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass  # One line per request would dominate the output and the timings
+
+
+server = make_server("127.0.0.1", 0, api_server.app, threaded=True, request_handler=QuietHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+if not api_server.market_data_ready.wait(timeout=600):  # Measure the warm server, not the preload
+    sys.exit(f"Market data not ready: {api_server.preload_error}")
+
+portfolios = []
+for _ in range(args.portfolios):
+    held = random.sample(tickers, random.randint(min_holdings, max_holdings))
+    portfolios.append({"tickers": held, "amounts": [round(random.uniform(500, 20000), 2) for _ in held],
+                       "budget": round(random.uniform(100, 5000), 2)})
+
+
+def next_request():
+    route = random.choices(list(mix), weights=list(mix.values()))[0]
+    if route == "ping":
+        return route, "GET", "/api/ping", None
+    if route == "login":
+        return route, "POST", "/api/login", {"email": f"user{random.randrange(args.users)}@example.com", "password": "password"}
+    return route, "POST", f"/api/{route}", random.choice(portfolios)
+
+
+latencies = defaultdict(list)
+errors = defaultdict(int)
+record_lock = threading.Lock()
+remaining = iter(range(args.requests))
+remaining_lock = threading.Lock()
+
+
+def client():
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port)
+    while True:
+        with remaining_lock:
+            if next(remaining, None) is None:
+                break
+        route, method, path, body = next_request()
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=None if body is None else json.dumps(body),
+                               headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            ok = False
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        elapsed = time.perf_counter() - start
+        with record_lock:
+            latencies[route].append(elapsed)
+            if not ok:
+                errors[route] += 1
+    connection.close()
+
+
+start = time.perf_counter()
+clients = [threading.Thread(target=client) for _ in range(args.clients)]
+for thread in clients:
+    thread.start()
+for thread in clients:
+    thread.join()
+wall = time.perf_counter() - start
+server.shutdown()
+shutil.rmtree(workdir, ignore_errors=True)
+
+report = {"clients": args.clients, "requests": args.requests, "wall_s": wall, "throughput_rps": args.requests / wall,
+          "universe": {"tickers": args.tickers, "days": args.days}, "routes": {}}
+print(f"{args.requests} requests from {args.clients} clients in {wall:.2f} s: {args.requests / wall:.1f} req/s")
+print(f"{'route':<8} {'count':>7} {'req/s':>8} {'errors':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+for route in mix:
+    times = np.array(latencies[route]) * 1000
+    if not len(times):
+        continue
+    p50, p95, p99 = np.percentile(times, [50, 95, 99])
+    report["routes"][route] = {"count": len(times), "throughput_rps": len(times) / wall, "error_rate": errors[route] / len(times),
+                               "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+    print(f"{route:<8} {len(times):>7} {len(times) / wall:>8.1f} {errors[route] / len(times):>8.2%} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f}")
+
+if args.output:
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Saved report to", args.output)
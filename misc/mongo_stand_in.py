@@ -0,0 +1,30 @@
+import threading
+
+from pymongo.errors import DuplicateKeyError
+
+# In-memory replacement for the users collection, for load tests that shouldn't need a Mongo server.
+
+
+def stand_in_environment(db_name):
+    """Mongo settings for a server whose users collection is replaced: the URI is unreachable and fails fast."""
+    return {"MONGO_DB": db_name, "MONGO_URI": "mongodb://localhost:1", "MONGO_SERVER_SELECTION_TIMEOUT_MS": "100"}
+
+
+class MemoryUsers:
+    """The slice of the pymongo collection API used by the auth routes, with a unique email index."""
+
+    def __init__(self):
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def create_index(self, keys, unique=False, name=None):
+        return name
+
+    def find_one(self, query):
+        return self._users.get(query["email"])
+
+    def insert_one(self, document):
+        with self._lock:
+            if document["email"] in self._users:
+                raise DuplicateKeyError("E11000 duplicate key error: email")
+            self._users[document["email"]] = dict(document)
@@ -0,0 +1,57 @@
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data import get_market_data
+
+# Shows that worker processes share the market data instead of each holding a copy (Linux only):
+# python misc/shared_memory_check.py [workers]
+# Every worker loads the artifact and reads all of it, like a worker that has served every kind of request.
+# Private memory should stay small and flat while the shared part is the size of the data, counted once.
+
+
+def smaps_rollup():
+    """Rss, Pss and private memory of the current process, in MiB."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": values["Rss"], "pss": values["Pss"], "private": values["Private_Clean"] + values["Private_Dirty"]}
+
+
+def worker(barrier, results):
+    market_data = get_market_data()
+    arrays = [market_data.returns, market_data.moments.mean, market_data.moments.var, market_data.moments.cov]
+    arrays += [market_data.windows.sums, market_data.windows.squares, market_data.windows.grams]
+    checksum = sum(float(np.asarray(array).sum()) for array in arrays)  # Page everything in
+    barrier.wait()  # Measure while every worker is holding the data
+    results.put((os.getpid(), checksum, smaps_rollup()))
+    barrier.wait()
+
+
+if __name__ == "__main__":  # Spawned workers re-import this file
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    market_data = get_market_data()  # Publish the artifact once, like the gunicorn master
+    arrays = [market_data.returns, market_data.moments.cov, market_data.windows.sums, market_data.windows.squares, market_data.windows.grams]
+    data_mib = sum(array.nbytes for array in arrays) / 2 ** 20
+
+    context = multiprocessing.get_context("spawn")
+    barrier, results = context.Barrier(n_workers), context.Queue()
+    processes = [context.Process(target=worker, args=(barrier, results)) for _ in range(n_workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    print(f"Market data arrays: {data_mib:.1f} MiB")
+    print(f"{'pid':>8} {'rss MiB':>9} {'pss MiB':>9} {'private MiB':>12}")
+    for pid, _, memory in rows:
+        print(f"{pid:>8} {memory['rss']:>9.1f} {memory['pss']:>9.1f} {memory['private']:>12.1f}")
+    print(f"Total PSS of {n_workers} workers: {sum(memory['pss'] for _, _, memory in rows):.1f} MiB")
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+# Synthetic market for the misc benchmarks and checks, so they run without downloading prices.
+# market_data is only imported by synthetic_market_data: it reads CSV_PATH/MARKET_DATA_PATH when imported,
+# and scripts such as load_test.py set those to their temp directory after generating the prices here.
+
+
+def synthetic_returns(n_tickers, n_days, seed=0):
+    """One-factor daily returns: correlated like real equities, so the rankings do real work."""
+    rng = np.random.default_rng(seed)
+    factor = rng.normal(0.0004, 0.01, (n_days, 1))
+    return factor * rng.uniform(0.5, 1.5, n_tickers) + rng.normal(0.0002, 0.015, (n_days, n_tickers))
+
+
+def synthetic_tickers(n_tickers):
+    return [f"T{i:05d}" for i in range(n_tickers)]
+
+
+def synthetic_prices(n_tickers, n_days, seed=0, returns=None):
+    """Adjusted close prices compounded from 100, laid out like historical_adjusted_prices.csv."""
+    if returns is None:
+        returns = synthetic_returns(n_tickers, n_days, seed)
+    prices = pd.DataFrame(100 * np.cumprod(1 + returns, axis=0), index=pd.bdate_range("2010-01-01", periods=n_days),
+                          columns=synthetic_tickers(n_tickers))
+    prices.index.name = "Date"
+    return prices
+
+
+def synthetic_market_data(n_tickers, n_days, seed=0, dtype=np.float64):
+    """MarketData over synthetic_returns, without going through prices."""
+    from market_data import MarketData
+
+    returns = np.asfortranarray(synthetic_returns(n_tickers, n_days, seed), dtype=dtype)
+    return MarketData(returns, synthetic_tickers(n_tickers), pd.bdate_range("1990-01-01", periods=n_days))
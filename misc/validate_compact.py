@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_data import CSV_PATH, WINDOW_ARRAYS, MarketData
+from portfolio_manager import PortfolioManager
+from synthetic_data import synthetic_prices
+
+# Checks that compact mode (MARKET_DATA_COMPACT=1: float32 returns and covariance, float64 sums) gives the same
+# answers as the float64 path: python misc/validate_compact.py [--portfolios 200]
+# Also reports the lookback window index, which compact mode leaves in float64 (see ReturnWindows) and, unless
+# MARKET_DATA_WARM_WINDOWS=1, only builds for the first windowed request.
+# Uses historical_adjusted_prices.csv when present, else a synthetic universe. Exits with status 1 on failure.
+SHARPE_RTOL = 1e-4  # Relative tolerance on every Sharpe ratio, return and std
+MOMENT_RTOL = 1e-5  # Relative tolerance on the means, variances and covariances (relative to the largest entry)
+
+parser = argparse.ArgumentParser(description="Compare compact (float32) market data against float64")
+parser.add_argument("--portfolios", type=int, default=200)
+parser.add_argument("--budgets", type=float, nargs="+", default=[100, 1000, 10000])
+parser.add_argument("--tickers", type=int, default=500, help="Synthetic universe size, when there is no CSV")
+parser.add_argument("--days", type=int, default=2520, help="Synthetic history length, when there is no CSV")
+args = parser.parse_args()
+
+if os.path.exists(CSV_PATH):
+    prices = pd.read_csv(CSV_PATH, index_col="Date", parse_dates=True)
+else:
+    prices = synthetic_prices(args.tickers, args.days)
+
+exact = MarketData.from_prices(prices, dtype=np.float64)
+compact = MarketData.from_prices(prices, dtype=np.float32)
+print(f"{len(exact.dates)} days x {len(exact.tickers)} tickers: returns {exact.returns.nbytes / 2 ** 20:.1f} MiB -> "
+      f"{compact.returns.nbytes / 2 ** 20:.1f} MiB, covariance {exact.moments.cov.nbytes / 2 ** 20:.1f} MiB -> "
+      f"{compact.moments.cov.nbytes / 2 ** 20:.1f} MiB")
+windows = compact.windows
+index_mib = sum(getattr(windows, name).nbytes for name in WINDOW_ARRAYS) / 2 ** 20
+print(f"Window index (float64 in both modes): {index_mib:.1f} MiB = sums + squares "
+      f"{(windows.sums.nbytes + windows.squares.nbytes) / 2 ** 20:.1f} MiB + {len(windows.grams) - 1} checkpoints "
+      f"{windows.grams.nbytes / 2 ** 20:.1f} MiB; compact total {(compact.returns.nbytes + compact.moments.cov.nbytes) / 2 ** 20 + index_mib:.1f} MiB")
+
+failures = []
+
+
+def check(name, expected, actual, rtol):
+    expected, actual = np.asarray(expected, dtype=np.float64), np.asarray(actual, dtype=np.float64)
+    if not expected.size:
+        return 0.0
+    error = np.abs(actual - expected).max() / max(np.abs(expected).max(), np.finfo(np.float64).tiny)
+    if not error <= rtol:
+        failures.append(f"{name}: relative error {error:.2e} > {rtol:.0e}")
+    return error
+
+
+worst = {}
+for name in ("mean", "var", "cov"):
+    worst[name] = check(name, getattr(exact.moments, name), getattr(compact.moments, name), MOMENT_RTOL)
+
+rng = np.random.default_rng(1)
+rank_mismatches = 0
+for p in range(args.portfolios):
+    held = list(rng.choice(exact.tickers, size=rng.integers(1, 30), replace=False))
+    amounts = list(rng.uniform(500, 20000, len(held)))
+    window = [None, "1y", "5y"][p % 3]
+    managers = [PortfolioManager(list(held), list(amounts), data, window=window) for data in (exact, compact)]
+
+    worst["current"] = max(worst.get("current", 0), check(f"portfolio {p} current metrics", managers[0]._current_metrics(),
+                                                          managers[1]._current_metrics(), SHARPE_RTOL))
+    for action in ("buy", "sell"):
+        rankings = [
+            pm.rank_stocks_for_buying_sweep(args.budgets) if action == "buy" else pm.rank_stocks_for_sell_sweep(args.budgets)
+            for pm in managers
+        ]
+        for budget, top_exact, top_compact in zip(args.budgets, *rankings):
+            if len(top_exact) != len(top_compact):
+                failures.append(f"portfolio {p} {action} {budget}: {len(top_exact)} vs {len(top_compact)} candidates")
+                continue
+            # A different ticker at the same rank is a near-tie: the metrics at that rank must still agree
+            rank_mismatches += sum(a[0] != b[0] for a, b in zip(top_exact, top_compact))
+            error = check(f"portfolio {p} {action} {budget}", [a[1:] for a in top_exact], [b[1:] for b in top_compact], SHARPE_RTOL)
+            worst[action] = max(worst.get(action, 0), error)
+
+for name, error in worst.items():
+    print(f"{name:<8} max relative error {error:.2e}")
+print(f"Tickers ranked differently (near-ties): {rank_mismatches}")
+
+if failures:
+    print(f"❌ {len(failures)} checks outside tolerance:")
+    for failure in failures[:20]:
+        print("  ", failure)
+    sys.exit(1)
+print(f"✅ Compact mode within tolerance (Sharpe/return/std {SHARPE_RTOL:.0e}, moments {MOMENT_RTOL:.0e})")
@@ -1,20 +1,224 @@
 import pandas as pd
 import numpy as np
 
+from market_data import MarketData
+from portfolio_solver import efficient_frontier, solve_max_sharpe, solve_min_variance, trade_list
+from request_timing import stage
+
+BOOTSTRAP_RESAMPLES = 5000
+BOOTSTRAP_BLOCK_LENGTH = 21  # Trading days per block (about a month), keeps volatility clustering within a resample
+BOOTSTRAP_CHUNK = 500  # Resamples per matrix product, bounds the (resamples x days) count matrix
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first, without sorting the whole array."""
+    if len(scores) > k:
+        candidates = np.sort(np.argpartition(-scores, k - 1)[:k])
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def blended_metrics(moments, a, b, columns, mean, variance, cov_with_stocks, risk_free_rate, sharpe_penalization=1):
+    """
+    Annualized Sharpe, return and std of the portfolio a * portfolio + b * stock for every stock in columns.
+    The blended mean and variance follow from the moments alone, no return vectors are built.
+    :param moments: ReturnMoments (or WindowMoments, FactorMoments) of the market data
+    :param mean: Daily mean return of the current portfolio
+    :param variance: Daily return variance of the current portfolio
+    :param cov_with_stocks: Covariance of the current portfolio with each stock in columns
+    """
+    new_mean = a * mean + b * moments.mean[columns]
+    new_variance = a ** 2 * variance + b ** 2 * moments.var[columns] + 2 * a * b * cov_with_stocks
+
+    expected_new_return = new_mean * 252
+    expected_new_std = np.sqrt(np.maximum(new_variance, 0)) * np.sqrt(252)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = (expected_new_return - risk_free_rate) / (expected_new_std ** sharpe_penalization)
+    return sharpe, expected_new_return, expected_new_std
+
+
+def block_bootstrap_counts(n_days, n_resamples, block_length, rng):
+    """
+    Moving block bootstrap as a (resamples x days) matrix of how often each day is drawn.
+    Every resample concatenates random blocks of consecutive days, cut to n_days.
+    """
+    n_blocks = -(-n_days // block_length)
+    starts = rng.integers(0, n_days - block_length + 1, size=(n_resamples, n_blocks))
+    days = (starts[:, :, None] + np.arange(block_length)).reshape(n_resamples, -1)[:, :n_days]
+    days += np.arange(n_resamples)[:, None] * n_days  # One bincount for the whole batch
+    return np.bincount(days.ravel(), minlength=n_resamples * n_days).reshape(n_resamples, n_days)
+
+
+def bootstrap_sharpe(series, risk_free_rate, n_resamples=BOOTSTRAP_RESAMPLES, block_length=BOOTSTRAP_BLOCK_LENGTH,
+                     sharpe_penalization=1, seed=None):
+    """
+    Annualized Sharpe of every column of series (days x portfolios) on every block bootstrap resample.
+    A resample's mean and second moment are its day counts times the returns and squared returns,
+    so all resamples of all columns come from two matrix products per chunk.
+    :return: (resamples x portfolios) array
+    """
+    n_days = len(series)
+    block_length = max(1, min(block_length, n_days))
+    rng = np.random.default_rng(seed)
+    squares = series ** 2
+
+    sharpe = np.empty((n_resamples, series.shape[1]))
+    for start in range(0, n_resamples, BOOTSTRAP_CHUNK):
+        counts = block_bootstrap_counts(n_days, min(BOOTSTRAP_CHUNK, n_resamples - start), block_length, rng).astype(np.float64)
+        mean = counts @ series / n_days
+        variance = np.maximum(counts @ squares / n_days - mean ** 2, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sharpe[start:start + len(counts)] = (mean * 252 - risk_free_rate) / ((np.sqrt(variance) * np.sqrt(252)) ** sharpe_penalization)
+    return sharpe
+
+
+def recommendation_payload(action, current_return, current_std, current_sharpe, top, budget):
+    """Build the /api/buy and /api/sell response from the current metrics and the ranked candidates."""
+    current = {
+        "return": current_return,
+        "std": current_std,
+        "risk-reward": current_sharpe
+    }
+    if not top:
+        return {
+            "current": current,
+            "top": [],
+            "recommendation": None
+        }
+
+    best_ticker, best_sharpe, best_return, best_std = top[0]
+    return {
+        "current": current,
+        "top": [
+            {
+                "ticker": ticker,
+                "risk-reward": sharpe,
+                "expected_return": ret,
+                "expected_std": std
+            }
+            for ticker, sharpe, ret, std in top
+        ],
+        "recommendation": {
+            "action": action,
+            "ticker": best_ticker,
+            "risk-reward_diff": best_sharpe - current_sharpe,
+            "return_diff": best_return - current_return,
+            "std_diff": current_std - best_std,
+            "amount": budget
+        }
+    }
+
+
+def swap_payload(current_return, current_std, current_sharpe, top, amount):
+    """Build the /api/swap response, in the style of recommendation_payload, from (sell, buy, sharpe, return, std) pairs."""
+    current = {
+        "return": current_return,
+        "std": current_std,
+        "risk-reward": current_sharpe
+    }
+    if not top:
+        return {
+            "current": current,
+            "top": [],
+            "recommendation": None
+        }
+
+    best_sell, best_buy, best_sharpe, best_return, best_std = top[0]
+    return {
+        "current": current,
+        "top": [
+            {
+                "sell": sell,
+                "buy": buy,
+                "risk-reward": sharpe,
+                "expected_return": ret,
+                "expected_std": std
+            }
+            for sell, buy, sharpe, ret, std in top
+        ],
+        "recommendation": {
+            "action": "swap",
+            "sell": best_sell,
+            "buy": best_buy,
+            "risk-reward_diff": best_sharpe - current_sharpe,
+            "return_diff": best_return - current_return,
+            "std_diff": current_std - best_std,
+            "amount": amount
+        }
+    }
+
+
+def correlation_clusters(correlation, threshold):
+    """
+    Single-linkage hierarchical clustering of a correlation matrix. Single linkage only ever merges along
+    the maximum spanning tree, so the tree is built first (Prim, one vectorized pass per ticker) and its
+    H - 1 edges are merged from the most to the least correlated with union-find: O(H^2) for H tickers.
+    :param threshold: Tickers end up in the same cluster when a chain of pairs correlated at least this much links them
+    :return: (cluster label per ticker, merges as [cluster, cluster, correlation, size] with merged clusters
+             numbered from H on, as in scipy's linkage)
+    """
+    n = len(correlation)
+    in_tree = np.zeros(n, dtype=bool)
+    in_tree[0] = True
+    best, link = correlation[0].copy(), np.zeros(n, dtype=np.intp)  # Best correlation with the tree, and through whom
+    edges = []
+    for _ in range(n - 1):
+        j = int(np.argmax(np.where(in_tree, -np.inf, best)))
+        edges.append((link[j], j, best[j]))
+        in_tree[j] = True
+        closer = correlation[j] > best
+        best[closer], link[closer] = correlation[j][closer], j
+    edges.sort(key=lambda edge: -edge[2])
+
+    parent, cluster_id, size = list(range(n)), list(range(n)), [1] * n
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]  # Path halving
+            i = parent[i]
+        return i
+
+    merges = []
+    labels = None
+    for i, j, rho in edges:
+        if labels is None and rho < threshold:
+            labels = [find(k) for k in range(n)]  # Components of the pairs above the threshold
+        a, b = find(i), find(j)
+        if size[a] < size[b]:
+            a, b = b, a
+        merges.append([cluster_id[a], cluster_id[b], rho, size[a] + size[b]])
+        parent[b] = a
+        size[a] += size[b]
+        cluster_id[a] = n + len(merges) - 1
+    if labels is None:
+        labels = [find(k) for k in range(n)]
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels, merges
+
 
 class PortfolioManager:
-    def __init__(self, initial_stocks, initial_weights, historical_data, risk_free_rate=0.045):
+    def __init__(self, initial_stocks, initial_weights, historical_data, risk_free_rate=0.045, window=None):
         """
         Initialize the portfolio with given stocks and weights.
         :param initial_stocks: List of initial stock tickers
         :param initial_weights: List of corresponding investment amounts
-        :param historical_csv_path: Path to CSV file containing historical adjusted close prices
-        :param metrics_csv_path: Path to CSV file containing precomputed expected return and volatility####For debugging
+        :param historical_data: MarketData store, or DataFrame of historical adjusted close prices
         :param risk_free_rate: Risk-free rate for Sharpe ratio calculation
+        :param window: Lookback used for every metric: None for the full history, "1y"/"3y"/"5y"/"10y",
+                       or {"start": date, "end": date}
         """
         assert len(initial_stocks) == len(initial_weights), f"Stocks and weights must have the same length! Got {len(initial_stocks)} stocks and {len(initial_weights)} weights."
-        self.historical_data = historical_data
-        self.stocks = self.historical_data.columns.tolist()
+        with stage("init"):
+            if isinstance(historical_data, MarketData):
+                self.market_data = historical_data
+            else:
+                self.market_data = MarketData.from_prices(historical_data)
+            self.historical_data = self.market_data.prices  # None when loaded from the prebuilt artifact
+            self.stocks = list(self.market_data.tickers)
+            start, end = self.market_data.window_rows(window)
+            self.window = slice(start, end)
+            self.moments = self.market_data.window_moments(window)
         
 
         self.sharpe_penalization = 1
@@ -33,14 +237,8 @@ class PortfolioManager:
             stock: weight / self.portfolio_value for stock, weight in zip(initial_stocks, initial_weights)
         }
         
-        # ### for debugging/prints:
-        # metrics = pd.read_csv(metrics_csv_path, index_col=0)
-        # self.expected_return = metrics["Expected Return (annualized)"] / 100
-        # self.volatility = metrics["Volatility (annualized)"] / 100
-        # ###
-
-        
         self.risk_free_rate = risk_free_rate
+        self._moment_state = None  # (mean, variance, covariance with every stock) of the current portfolio
         self.rolling_returns = []  # ±2520 to store last 10 years of daily portfolio returns
         self.update_rolling_returns()
         
@@ -52,6 +250,9 @@ class PortfolioManager:
     def diagnose_data(self, stage="Initial Load"):
         """Diagnose potential issues in historical data."""
         print(f"📌 Diagnosing historical data... ({stage})")
+        if self.historical_data is None:
+            print("⚠️ Warning: No price history loaded (market data came from the prebuilt artifact).")
+            return
 
         # ✅ Check if all stocks have the same number of records
         record_lengths = self.historical_data.count()
@@ -91,17 +292,42 @@ class PortfolioManager:
 
         print("✅ Data diagnosis complete.")
     
+    def _stock_returns(self, stock):
+        """Daily returns of a stock over the portfolio's window, as float64 (compact mode stores float32)."""
+        return np.asarray(self.market_data.column(stock, self.window), dtype=np.float64)
+
     def update_rolling_returns(self):
         """Store the full history of portfolio returns, ensuring alignment with historical data."""
-        stock_returns = self.historical_data.pct_change().dropna()
+        with stage("rolling_returns"):
+            stock_returns = self.market_data.columns(list(self.portfolio_weights.keys()), self.window)
+            self._moment_state = None
 
-        if len(stock_returns) > len(self.historical_data):
-            stock_returns = stock_returns.iloc[-len(self.historical_data):]  # Trim stock_returns if needed
-
-        self.rolling_returns = stock_returns[list(self.portfolio_weights.keys())].dot(
-            np.array(list(self.portfolio_weights.values()))
-        ).tolist()
+            self.rolling_returns = stock_returns.dot(
+                np.array(list(self.portfolio_weights.values()), dtype=np.float64)
+            )
     
+    @property
+    def expected_return(self):
+        """Annualized expected return per stock, from the precomputed statistics."""
+        return pd.Series(self.moments.mean * 252, index=self.stocks)
+
+    @property
+    def volatility(self):
+        """Annualized volatility per stock, from the precomputed statistics."""
+        return pd.Series(np.sqrt(self.moments.var * 252), index=self.stocks)
+
+    @property
+    def portfolio_expected_return(self):
+        """Annualized expected return of the current portfolio."""
+        mean, _, _ = self._portfolio_moments(held_only=True)
+        return mean * 252
+
+    @property
+    def portfolio_volatility(self):
+        """Annualized volatility of the current portfolio."""
+        _, variance, _ = self._portfolio_moments(held_only=True)
+        return np.sqrt(variance * 252)
+
     def get_portfolio_return(self):
         """Return the current rolling portfolio return series."""
         return self.portfolio_expected_return
@@ -132,7 +358,7 @@ class PortfolioManager:
         """Return the updated portfolio standard deviation if a stock is bought."""
         stock_return = self.expected_return[stock]
         stock_std = self.volatility[stock]
-        correlation = self.historical_data[stock].pct_change().corr(self.calculate_portfolio_returns())
+        correlation = pd.Series(self._stock_returns(stock)).corr(self.calculate_portfolio_returns())
 
         new_weight = buy_amount / (self.portfolio_value + buy_amount)
         expected_new_std = np.sqrt(
@@ -147,12 +373,12 @@ class PortfolioManager:
         """Return the updated portfolio standard deviation, expectation if a stock is bought."""
         
         # Drop NaN values from pct_change()
-        stock_vector = np.array(self.historical_data[stock].pct_change().dropna())
+        stock_vector = self._stock_returns(stock)
 
         new_weight = buy_amount / (self.portfolio_value + buy_amount)
 
         # Compute updated portfolio vector
-        updated_portfolio_vector = np.array(self.rolling_returns) * (1 - new_weight) + stock_vector * new_weight
+        updated_portfolio_vector = np.asarray(self.rolling_returns) * (1 - new_weight) + stock_vector * new_weight
 
 
         expected_new_return = updated_portfolio_vector.mean() * 252
@@ -164,7 +390,7 @@ class PortfolioManager:
     
     def get_updates_for_sell_old(self, stock, sell_amount):
         """Return the updated portfolio standard deviation, expectation if a stock is sold."""
-        stock_vector = np.array(self.historical_data[stock].pct_change().dropna())
+        stock_vector = self._stock_returns(stock)
         stock_weight = sell_amount / self.portfolio_value
         
         updated_portfolio_vector = self.calculate_portfolio_returns() - stock_vector * stock_weight
@@ -175,10 +401,10 @@ class PortfolioManager:
     
     def get_updates_for_sell(self, stock, sell_amount):
         """Return the updated portfolio standard deviation, expectation if a stock is sold."""
-        stock_vector = np.array(self.historical_data[stock].pct_change().dropna())
+        stock_vector = self._stock_returns(stock)
         V_new = self.portfolio_value - sell_amount   
                      
-        updated_portfolio_vector = np.array(self.rolling_returns) * (self.portfolio_value / V_new) - stock_vector * (sell_amount / V_new)
+        updated_portfolio_vector = np.asarray(self.rolling_returns) * (self.portfolio_value / V_new) - stock_vector * (sell_amount / V_new)
         
         expected_new_return = updated_portfolio_vector.mean() * 252
         expected_new_std = updated_portfolio_vector.std() * np.sqrt(252)
@@ -190,6 +416,19 @@ class PortfolioManager:
         if stock not in self.stocks:
             return  # Skip stocks without data
         
+        V_old = self.portfolio_value
+        self._apply_buy(stock, buy_amount)
+        
+        # self.update_rolling_returns()
+        stock_vector = self._stock_returns(stock)  
+        #current_vec = stock_vector*buy_amount/V_old + future_vector*V_new/V_old
+        #current_vec*V_old = stock_vector*buy_amount + future_vector*V_new
+        #future_vector*V_new = current_vec*V_old - stock_vector*buy_amount
+        #future_vector = (current_vec*V_old - stock_vector*buy_amount)/V_new
+        self.rolling_returns = np.asarray(self.rolling_returns) * (V_old / self.portfolio_value) + stock_vector * (buy_amount / self.portfolio_value)
+
+    def _apply_buy(self, stock, buy_amount):
+        """Update the weights and the cached moments for a buy; O(N), the return vectors are not touched."""
         V_old = self.portfolio_value
         self.portfolio_value = V_old + buy_amount
         
@@ -200,16 +439,9 @@ class PortfolioManager:
             self.portfolio_weights[stock] += buy_amount / self.portfolio_value
         else:
             self.portfolio_weights[stock] = buy_amount / self.portfolio_value
-        
-        # self.update_rolling_returns()
-        stock_vector = np.array(self.historical_data[stock].pct_change().dropna())  
-        #current_vec = stock_vector*buy_amount/V_old + future_vector*V_new/V_old
-        #current_vec*V_old = stock_vector*buy_amount + future_vector*V_new
-        #future_vector*V_new = current_vec*V_old - stock_vector*buy_amount
-        #future_vector = (current_vec*V_old - stock_vector*buy_amount)/V_new
-        self.rolling_returns = np.array(self.rolling_returns) * (V_old / self.portfolio_value) + stock_vector * (buy_amount / self.portfolio_value)
 
-        
+        # new portfolio = (1 - w) * portfolio + w * stock
+        self._update_moment_state(stock, V_old / self.portfolio_value, buy_amount / self.portfolio_value)
     
     def sell_stock(self, stock, sell_amount):
         """Sell a stock, decreasing portfolio value and updating weights."""
@@ -224,8 +456,22 @@ class PortfolioManager:
         
         V_old = self.portfolio_value
         V_new = V_old - sell_amount
+        self._apply_sell(stock, sell_amount)
         
+        #current_vec = stock_vector*sell_amount/V_old + future_vec*V_new/V_old
+        #current_vec*V_old = stock_vector*sell_amount + future_vec*V_new
+        #future_vec*V_new = current_vec*V_old - stock_vector*sell_amount
+        #future_vec = (current_vec*V_old - stock_vector*sell_amount)/V_new
         
+        # self.update_rolling_returns()
+        stock_vector = self._stock_returns(stock)
+        self.rolling_returns = np.asarray(self.rolling_returns) * (V_old / V_new) - stock_vector * (sell_amount / V_new)
+
+    def _apply_sell(self, stock, sell_amount):
+        """Update the weights and the cached moments for a sell; O(N), the return vectors are not touched."""
+        stock_value = self.portfolio_weights[stock] * self.portfolio_value
+        V_old = self.portfolio_value
+        V_new = V_old - sell_amount
         
         for s in self.portfolio_weights:
             if s != stock:
@@ -237,54 +483,339 @@ class PortfolioManager:
         else:
             del self.portfolio_weights[stock]
         
-        
         self.portfolio_value = V_new
-        
-        #current_vec = stock_vector*sell_amount/V_old + future_vec*V_new/V_old
-        #current_vec*V_old = stock_vector*sell_amount + future_vec*V_new
-        #future_vec*V_new = current_vec*V_old - stock_vector*sell_amount
-        #future_vec = (current_vec*V_old - stock_vector*sell_amount)/V_new
-        
-        # self.update_rolling_returns()
-        stock_vector = np.array(self.historical_data[stock].pct_change().dropna())
-        self.rolling_returns = np.array(self.rolling_returns) * (V_old / V_new) - stock_vector * (sell_amount / V_new)
-        
-        
-    
+
+        # new portfolio = (V_old / V_new) * portfolio - (sell_amount / V_new) * stock
+        self._update_moment_state(stock, V_old / V_new, -sell_amount / V_new)
+
+    def _update_moment_state(self, stock, a, b):
+        """Move the cached moments to a * portfolio + b * stock in O(N) instead of recomputing them."""
+        if self._moment_state is None:
+            return
+        moments = self.moments
+        column = self.market_data.index[stock]
+        mean, variance, cov_with_portfolio = self._moment_state
+
+        variance = a ** 2 * variance + b ** 2 * moments.var[column] + 2 * a * b * cov_with_portfolio[column]
+        self._moment_state = (
+            a * mean + b * moments.mean[column],
+            variance,
+            a * cov_with_portfolio + b * moments.cov_with([column], np.ones(1)),
+        )
+
+    def _portfolio_moments(self, held_only=False):
+        """
+        Daily mean/variance of the current portfolio and its covariance with every stock.
+        With held_only the covariance only covers the held stocks (the covariance sub-block),
+        in portfolio_weights order.
+        The full covariance vector is cached and kept up to date by buy_stock/sell_stock.
+        """
+        moments = self.moments
+        columns = [self.market_data.index[stock] for stock in self.portfolio_weights]
+
+        if self._moment_state is not None:
+            mean, variance, cov_with_portfolio = self._moment_state
+            return mean, variance, (cov_with_portfolio[columns] if held_only else cov_with_portfolio)
+
+        weights = np.array(list(self.portfolio_weights.values()), dtype=np.float64)
+        mean = moments.mean[columns] @ weights
+        if held_only:
+            cov_with_portfolio = moments.cov_with(columns, weights, rows=columns)
+            variance = cov_with_portfolio @ weights
+        else:
+            cov_with_portfolio = moments.cov_with(columns, weights)
+            variance = cov_with_portfolio[columns] @ weights
+            self._moment_state = (mean, variance, cov_with_portfolio)
+        return mean, variance, cov_with_portfolio
+
+    def _blended_metrics(self, a, b, columns, mean, variance, cov_with_stocks):
+        """Annualized Sharpe, return and std of a * portfolio + b * stock for every stock in columns."""
+        return blended_metrics(
+            self.moments, a, b, columns, mean, variance, cov_with_stocks,
+            self.risk_free_rate, self.sharpe_penalization
+        )
+
     def rank_stocks_for_buying(self, buy_amount):
         """Rank stocks by improvement in Sharpe ratio if bought."""
-        ranking = []
+        return self.rank_stocks_for_buying_sweep([buy_amount])[0]
 
-        for stock in self.stocks:
-            if stock in self.portfolio_weights and self.portfolio_weights[stock] > 0.06:
-                continue  # Skip if stock is already overweighted
+    def rank_stocks_for_buying_sweep(self, buy_amounts, k=5):
+        """
+        Rank stocks for every buy amount in one pass.
+        The blended mean and variance are quadratic in the new weight, so the whole
+        (amounts x stocks) grid costs one covariance product plus elementwise work.
+        """
+        mean, variance, cov_with_portfolio = self._portfolio_moments()
 
-            expected_new_std, expected_new_return = self.get_updates_for_buy(stock, buy_amount)
-            sharpe = (expected_new_return - self.risk_free_rate) / (expected_new_std ** self.sharpe_penalization)
+        candidates = np.ones(len(self.stocks), dtype=bool)
+        for stock, weight in self.portfolio_weights.items():
+            if weight > 0.06:
+                candidates[self.market_data.index[stock]] = False  # Skip if stock is already overweighted
+        columns = np.flatnonzero(candidates)
 
-            ranking.append((stock, sharpe, expected_new_return, expected_new_std))
+        buy_amounts = np.asarray(buy_amounts, dtype=np.float64)[:, None]
+        new_weight = buy_amounts / (self.portfolio_value + buy_amounts)
+        sharpe, expected_new_return, expected_new_std = self._blended_metrics(
+            1 - new_weight, new_weight, columns, mean, variance, cov_with_portfolio[columns]
+        )
 
-        # Sort by Sharpe improvement (descending)
-        return sorted(ranking, key=lambda x: x[1], reverse=True)[:5]
+        return [
+            [
+                (self.stocks[columns[i]], sharpe[row, i], expected_new_return[row, i], expected_new_std[row, i])
+                for i in top_k(sharpe[row], k)
+            ]
+            for row in range(len(buy_amounts))
+        ]
     
     def rank_stocks_for_sell(self, sell_amount):
         """Rank stocks by improvement in Sharpe ratio if sold."""
-        ranking = []
+        return self.rank_stocks_for_sell_sweep([sell_amount])[0]
+
+    def rank_stocks_for_sell_sweep(self, sell_amounts, k=5):
+        """Rank held stocks for every sell amount in one pass over the held covariance sub-block."""
+        stocks = list(self.portfolio_weights)
+        columns = np.array([self.market_data.index[stock] for stock in stocks], dtype=np.intp)
+        weights = np.array(list(self.portfolio_weights.values()), dtype=np.float64)
+        mean, variance, cov_with_held = self._portfolio_moments(held_only=True)
 
-        for stock in self.portfolio_weights:
-            stock_weight = self.portfolio_weights[stock]
-            if sell_amount > stock_weight * self.portfolio_value:
-                continue
+        sell_amounts = np.asarray(sell_amounts, dtype=np.float64)[:, None]
+        sellable = ~(sell_amounts > weights * self.portfolio_value)  # Skip if selling more than the position
+        V_new = self.portfolio_value - sell_amounts
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sharpe, expected_new_return, expected_new_std = self._blended_metrics(
+                self.portfolio_value / V_new, -sell_amounts / V_new, columns, mean, variance, cov_with_held
+            )
+        valid = sellable & ~(expected_new_std <= 0)
 
-            expected_new_std, expected_new_return = self.get_updates_for_sell(stock, sell_amount)
-            if expected_new_std <= 0:
-                continue
+        rankings = []
+        for row in range(len(sell_amounts)):
+            positions = np.flatnonzero(valid[row])
+            rankings.append([
+                (stocks[positions[i]], sharpe[row, positions[i]], expected_new_return[row, positions[i]], expected_new_std[row, positions[i]])
+                for i in top_k(sharpe[row, positions], k)
+            ])
+        return rankings
+
+    def rank_swaps(self, swap_amount, k=5):
+        """
+        Rank every (held stock, stock to buy) pair by the Sharpe ratio after selling swap_amount of the first
+        and buying swap_amount of the second. The portfolio value is unchanged, so the new portfolio is
+        portfolio + c * (stock - held) with c = swap_amount / value, and the whole (held x stocks) grid
+        follows from the held rows of the covariance matrix.
+        :return: Up to k (sell ticker, buy ticker, sharpe, return, std) tuples, best first
+        """
+        held = list(self.portfolio_weights)
+        held_columns = np.array([self.market_data.index[stock] for stock in held], dtype=np.intp)
+        weights = np.array(list(self.portfolio_weights.values()), dtype=np.float64)
+        mean, variance, cov_with_portfolio = self._portfolio_moments()
+        moments = self.moments
 
+        candidates = np.ones(len(self.stocks), dtype=bool)
+        candidates[held_columns[weights > 0.06]] = False  # Skip if stock is already overweighted, as when buying
+        columns = np.flatnonzero(candidates)
+        cov_held = moments.cov_rows(held_columns)[:, columns]
+
+        c = swap_amount / self.portfolio_value
+        held_mean = moments.mean[held_columns][:, None]
+        held_var = moments.var[held_columns][:, None]
+        held_cov_with_portfolio = cov_with_portfolio[held_columns][:, None]
+        new_mean = mean + c * (moments.mean[columns] - held_mean)
+        new_variance = (variance + c ** 2 * (held_var + moments.var[columns] - 2 * cov_held)
+                        + 2 * c * (cov_with_portfolio[columns] - held_cov_with_portfolio))
+
+        expected_new_return = new_mean * 252
+        expected_new_std = np.sqrt(np.maximum(new_variance, 0)) * np.sqrt(252)
+        with np.errstate(divide="ignore", invalid="ignore"):
             sharpe = (expected_new_return - self.risk_free_rate) / (expected_new_std ** self.sharpe_penalization)
-            ranking.append((stock, sharpe, expected_new_return, expected_new_std))
 
-        return sorted(ranking, key=lambda x: x[1], reverse=True)[:5]
+        valid = ~(swap_amount > weights * self.portfolio_value)[:, None] & ~(expected_new_std <= 0)  # Skip if selling more than the position
+        valid &= held_columns[:, None] != columns  # Swapping a stock for itself is a no-op
+        pairs = np.flatnonzero(valid)
+        rows, cols = np.divmod(pairs[top_k(sharpe.ravel()[pairs], k)], len(columns))
+        return [
+            (held[row], self.stocks[columns[col]], sharpe[row, col], expected_new_return[row, col], expected_new_std[row, col])
+            for row, col in zip(rows, cols)
+        ]
+
+    def get_swap_recommendations(self, amount):
+        """Best (sell, buy) pairs for swapping amount from one holding into another stock."""
+        current = self._current_metrics()
+        with stage("rank"):
+            top = self.rank_swaps(amount)
+        return swap_payload(*current, top, amount)
+
+    def optimize_greedy(self, amount=5000, max_iterations=300):
+        """
+        Greedy rebalancing: repeatedly buy the best-ranked stock and sell the best-ranked holding.
+        Converges when the same stock is bought and sold. Each step updates the cached covariance
+        vector in O(N); the rolling returns are rebuilt once at the end.
+        :param amount: Dollar amount of every buy and sell
+        :param max_iterations: Maximum number of buy/sell rounds
+        :return: Dict with the trades made, the Sharpe ratio after every round and whether it converged
+        """
+        def current_sharpe():
+            mean, variance, _ = self._portfolio_moments()
+            return (mean * 252 - self.risk_free_rate) / ((np.sqrt(variance) * np.sqrt(252)) ** self.sharpe_penalization)
+
+        sharpe_history = [current_sharpe()]
+        trades = []
+        converged = False
+        iterations = 0
+
+        while iterations < max_iterations:
+            iterations += 1
+            optional_buys = self.rank_stocks_for_buying(amount)
+            if not optional_buys:
+                break
+            best_to_buy = optional_buys[0][0]
+            self._apply_buy(best_to_buy, amount)
+
+            optional_sells = self.rank_stocks_for_sell(amount)
+            if not optional_sells:
+                trades.append({"action": "buy", "ticker": best_to_buy, "amount": amount})
+                break
+            best_to_sell = optional_sells[0][0]
+            self._apply_sell(best_to_sell, amount)
+
+            if best_to_buy == best_to_sell:
+                converged = True  # The round was a no-op, so the portfolio is where the previous round left it
+                break
+            trades.append({"action": "buy", "ticker": best_to_buy, "amount": amount})
+            trades.append({"action": "sell", "ticker": best_to_sell, "amount": amount})
+            sharpe_history.append(current_sharpe())
+
+        self.update_rolling_returns()
+        return {
+            "converged": converged,
+            "iterations": iterations,
+            "trades": trades,
+            "sharpe_history": sharpe_history,
+        }
+
+    def _dense_cov(self):
+        """
+        The full covariance matrix, for the solvers over the whole universe. Factor mode doesn't keep one,
+        and a lookback window would build an N x N matrix per request, so both are refused in factor mode.
+        """
+        if self.market_data.factors:
+            raise ValueError("Not available in factor mode (MARKET_DATA_FACTORS): it needs the full covariance matrix")
+        return self.moments.cov
+
+    def solve_target_weights(self, mode="max_sharpe", target_return=None, cap=None):
+        """
+        Solve for long-only target weights directly from the precomputed moments, instead of simulating trades.
+        :param mode: "max_sharpe", or "min_variance" (optionally at an annualized target_return)
+        :param target_return: Minimum annualized expected return for "min_variance"
+        :param cap: Optional maximum weight per stock, e.g. the 0.06 overweight rule of rank_stocks_for_buying
+        :return: Dict with the target weights, the trades to get there from the current holdings, and the expected metrics
+        """
+        moments = self.moments
+        if mode not in ("max_sharpe", "min_variance"):
+            raise ValueError(f"Unknown solver mode: {mode}")
+        cov = self._dense_cov()
+        if mode == "max_sharpe":
+            weights = solve_max_sharpe(moments.mean, cov, self.risk_free_rate / 252, cap)
+        else:
+            weights = solve_min_variance(moments.mean, cov, None if target_return is None else target_return / 252, cap)
+
+        current_amounts = np.zeros(len(self.stocks))
+        for stock, weight in self.portfolio_weights.items():
+            current_amounts[self.market_data.index[stock]] = weight * self.portfolio_value
+
+        expected_return = moments.mean @ weights * 252
+        expected_std = np.sqrt(weights @ cov @ weights) * np.sqrt(252)
+        return {
+            "weights": {self.stocks[i]: weights[i] for i in np.flatnonzero(weights > 1e-6)},
+            "trades": trade_list(self.stocks, current_amounts, weights * self.portfolio_value),
+            "expected_return": expected_return,
+            "expected_std": expected_std,
+            "risk-reward": (expected_return - self.risk_free_rate) / (expected_std ** self.sharpe_penalization),
+        }
+
+    def efficient_frontier(self, n_points=50, cap=None, candidates=None, budget=None):
+        """
+        Long-only efficient frontier from the precomputed moments, with the current portfolio to plot against it.
+        :param n_points: Points on the curve, from the minimum-variance to the highest-return portfolio
+        :param cap: Optional maximum weight per stock
+        :param candidates: If given, only the holdings plus this many top buy candidates are invested in
+                           (required in factor mode, which has no full covariance matrix)
+        :param budget: Buy amount the candidates are ranked for (default: 10% of the portfolio value)
+        :return: Dict with the frontier points, the current portfolio's return, std and Sharpe, and the universe size
+        """
+        moments = self.moments
+        if candidates is None:
+            columns = np.arange(len(self.stocks))
+            cov = self._dense_cov()
+        else:
+            top = self.rank_stocks_for_buying_sweep([budget or 0.1 * self.portfolio_value], k=candidates)[0]
+            columns = np.unique([self.market_data.index[stock] for stock in self.portfolio_weights] +
+                                [self.market_data.index[ticker] for ticker, *_ in top])
+            cov = moments.cov_rows(columns)[:, columns]  # Only the rows of the universe are read
+        mean = moments.mean[columns]
+
+        weights = efficient_frontier(mean, cov, n_points, cap)
+        returns = weights @ mean * 252
+        stds = np.sqrt(np.maximum(np.sum((weights @ cov) * weights, axis=1), 0)) * np.sqrt(252)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sharpes = (returns - self.risk_free_rate) / (stds ** self.sharpe_penalization)
+
+        current_return, current_std = self.portfolio_expected_return, self.portfolio_volatility
+        return {
+            "frontier": [
+                {
+                    "return": returns[i],
+                    "std": stds[i],
+                    "risk-reward": sharpes[i],
+                    "weights": {self.stocks[columns[j]]: weights[i, j] for j in np.flatnonzero(weights[i] > 1e-6)}
+                }
+                for i in range(len(weights))
+            ],
+            "portfolio": {
+                "return": current_return,
+                "std": current_std,
+                "risk-reward": (current_return - self.risk_free_rate) / (current_std ** self.sharpe_penalization)
+            },
+            "universe": len(columns)
+        }
+
+    def diversification(self, threshold=0.7):
+        """
+        Diversification analytics of the holdings, from the held block of the precomputed covariance.
+        :param threshold: Correlation that puts two holdings in the same cluster (see correlation_clusters)
+        :return: Dict with the holdings, their weights and correlation matrix, the diversification ratio,
+                 the effective number of bets, the correlation clusters and the full clustering tree
+        """
+        stocks = list(self.portfolio_weights)
+        columns = np.array([self.market_data.index[stock] for stock in stocks], dtype=np.intp)
+        weights = np.array(list(self.portfolio_weights.values()), dtype=np.float64)
+        cov = self.moments.cov_rows(columns)[:, columns]  # (held x held), read from the held rows only
+
+        std = np.sqrt(np.maximum(np.diag(cov), 0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = np.nan_to_num(cov / np.outer(std, std))  # A constant series is uncorrelated with everything
+        np.fill_diagonal(correlation, 1)
+        correlation = np.clip(correlation, -1, 1)
 
+        portfolio_std = np.sqrt(max(weights @ cov @ weights, 0))
+        diversification_ratio = weights @ std / portfolio_std if portfolio_std > 0 else None
+
+        # Effective number of bets (Meucci): entropy of the risk spread over the principal portfolios
+        eigenvalues, eigenvectors = np.linalg.eigh(cov)
+        risk = (eigenvectors.T @ weights) ** 2 * np.maximum(eigenvalues, 0)
+        shares = risk[risk > 0] / risk.sum() if risk.sum() > 0 else np.ones(1)
+        effective_number_of_bets = float(np.exp(-shares @ np.log(shares)))
+
+        labels, merges = correlation_clusters(correlation, threshold)
+        clusters = [[stocks[i] for i in np.flatnonzero(labels == label)] for label in range(labels.max() + 1)]
+        return {
+            "tickers": stocks,
+            "weights": list(weights),
+            "correlation": correlation.tolist(),
+            "diversification_ratio": diversification_ratio,
+            "effective_number_of_bets": effective_number_of_bets,
+            "clusters": sorted(clusters, key=len, reverse=True),
+            "linkage": merges
+        }
 
     def normalize_weights(self):
         """Ensure portfolio weights sum exactly to 1 after rounding dollar values to integers."""
@@ -301,6 +832,7 @@ class PortfolioManager:
         # Step 4: Recalculate weights from the rounded amounts
         self.portfolio_weights = {stock: amt / new_portfolio_value for stock, amt in portfolio_amounts.items()}
         self.portfolio_value = new_portfolio_value  # Update total portfolio value
+        self._moment_state = None
 
         # Step 5: Assert weights sum exactly to 1
         total_weight = sum(self.portfolio_weights.values())
@@ -308,97 +840,193 @@ class PortfolioManager:
         
         print("✅ Portfolio weights normalized successfully!")
         
-    def get_buy_recommendations(self, budget):
-        expected_new_return = np.array(self.rolling_returns).mean() * 252
-        expected_new_std = np.array(self.rolling_returns).std() * np.sqrt(252)
-        current_sharpe = (expected_new_return - self.risk_free_rate) / (expected_new_std ** self.sharpe_penalization)
-
-        top = self.rank_stocks_for_buying(budget)
-        if not top:
-            return {
-                "current": {
-                    "return": expected_new_return,
-                    "std": expected_new_std,
-                    "risk-reward": current_sharpe
-                },
-                "top": [],
-                "recommendation": None
-            }
+    def _current_metrics(self):
+        """Annualized return, std and Sharpe of the current rolling returns."""
+        rolling_returns = np.asarray(self.rolling_returns, dtype=np.float64)  # No copy: already a float64 array
+        expected_return = rolling_returns.mean() * 252
+        expected_std = rolling_returns.std() * np.sqrt(252)
+        current_sharpe = (expected_return - self.risk_free_rate) / (expected_std ** self.sharpe_penalization)
+        return expected_return, expected_std, current_sharpe
+
+    def bootstrap_candidates(self, action, amount, tickers, n_resamples=BOOTSTRAP_RESAMPLES,
+                             block_length=BOOTSTRAP_BLOCK_LENGTH, confidence=0.95, seed=0):
+        """
+        How robust the ranking of tickers is: block-bootstrap the daily returns over the portfolio's window
+        and recompute the current Sharpe and the Sharpe after trading amount of each ticker on every resample.
+        :param action: "buy" or "sell"
+        :param tickers: Candidates to compare, e.g. the "top" of get_buy_recommendations
+        :param confidence: Coverage of the percentile intervals
+        :param seed: Random seed, so the same request gets the same intervals
+        :return: Dict with the intervals of the current Sharpe and of every candidate's Sharpe and Sharpe difference,
+                 the probability that each candidate improves on the current Sharpe, and that it ranks first
+        """
+        portfolio = np.asarray(self.rolling_returns, dtype=np.float64)
+        V = self.portfolio_value
+        if action == "buy":
+            a, b = V / (V + amount), amount / (V + amount)
+        else:
+            a, b = V / (V - amount), -amount / (V - amount)
+
+        series = np.empty((len(portfolio), len(tickers) + 1))
+        series[:, 0] = portfolio
+        for i, ticker in enumerate(tickers):
+            series[:, i + 1] = a * portfolio + b * self._stock_returns(ticker)
 
-        best_ticker, best_sharpe, best_return, best_std = top[0]
-        sharpe_diff = best_sharpe - current_sharpe
-        return_diff = best_return - expected_new_return
-        std_diff = expected_new_std - best_std
+        with stage("bootstrap"):
+            sharpe = bootstrap_sharpe(series, self.risk_free_rate, n_resamples, block_length, self.sharpe_penalization, seed)
+        diff = sharpe[:, 1:] - sharpe[:, :1]  # Paired: the candidates and the current portfolio share every resample
+        tail = 100 * (1 - confidence) / 2
+        bounds = [tail, 100 - tail]
+        best = np.bincount(np.argmax(sharpe[:, 1:], axis=1), minlength=len(tickers)) / n_resamples if tickers else []
 
         return {
-            "current": {
-                "return": expected_new_return,
-                "std": expected_new_std,
-                "risk-reward": current_sharpe
-            },
-            "top": [
+            "resamples": n_resamples,
+            "block_length": block_length,
+            "confidence": confidence,
+            "current": {"risk-reward_ci": list(np.percentile(sharpe[:, 0], bounds))},
+            "candidates": [
                 {
                     "ticker": ticker,
-                    "risk-reward": sharpe,
-                    "expected_return": ret,
-                    "expected_std": std
+                    "risk-reward_ci": list(np.percentile(sharpe[:, i + 1], bounds)),
+                    "risk-reward_diff_ci": list(np.percentile(diff[:, i], bounds)),
+                    "prob_improves": float(np.mean(diff[:, i] > 0)),
+                    "prob_best": float(best[i])
                 }
-                for ticker, sharpe, ret, std in top
-            ],
-            "recommendation": {
-                "action": "buy",
-                "ticker": best_ticker,
-                "risk-reward_diff": sharpe_diff,
-                "return_diff": return_diff,
-                "std_diff": std_diff,
-                "amount": budget
-            }
+                for i, ticker in enumerate(tickers)
+            ]
         }
 
+    def get_buy_recommendations(self, budget, bootstrap=None):
+        return self.get_buy_recommendations_sweep([budget], bootstrap)[0]
 
-    def get_sell_recommendations(self, budget):
-        expected_new_return = np.array(self.rolling_returns).mean() * 252
-        expected_new_std = np.array(self.rolling_returns).std() * np.sqrt(252)
-        current_sharpe = (expected_new_return - self.risk_free_rate) / (expected_new_std ** self.sharpe_penalization)
-
-        top = self.rank_stocks_for_sell(budget)
-        if not top:
-            return {
-                "current": {
-                    "return": expected_new_return,
-                    "std": expected_new_std,
-                    "risk-reward": current_sharpe
-                },
-                "top": [],
-                "recommendation": None
-            }
+    def get_sell_recommendations(self, budget, bootstrap=None):
+        return self.get_sell_recommendations_sweep([budget], bootstrap)[0]
 
-        best_ticker, best_sharpe, best_return, best_std = top[0]
-        sharpe_diff = best_sharpe - current_sharpe
-        return_diff = best_return - expected_new_return
-        std_diff = expected_new_std - best_std
+    def get_buy_recommendations_sweep(self, budgets, bootstrap=None):
+        """
+        Buy recommendations for every budget, ranked in a single pass.
+        :param bootstrap: Optional bootstrap_candidates options ({} for the defaults); adds a "bootstrap" entry per budget
+        """
+        current = self._current_metrics()
+        with stage("rank"):
+            rankings = self.rank_stocks_for_buying_sweep(budgets)
+        return [self._recommendation_payload("buy", current, top, budget, bootstrap) for budget, top in zip(budgets, rankings)]
 
-        return {
-            "current": {
-                "return": expected_new_return,
-                "std": expected_new_std,
-                "risk-reward": current_sharpe
-            },
-            "top": [
-                {
-                    "ticker": ticker,
-                    "risk-reward": sharpe,
-                    "expected_return": ret,
-                    "expected_std": std
-                }
-                for ticker, sharpe, ret, std in top
-            ],
-            "recommendation": {
-                "action": "sell",
-                "ticker": best_ticker,
-                "risk-reward_diff": sharpe_diff,
-                "return_diff": return_diff,
-                "std_diff": std_diff,
-                "amount": budget
-            }
-        }
+    def get_sell_recommendations_sweep(self, budgets, bootstrap=None):
+        """Sell recommendations for every budget, ranked in a single pass (bootstrap as for buying)."""
+        current = self._current_metrics()
+        with stage("rank"):
+            rankings = self.rank_stocks_for_sell_sweep(budgets)
+        return [self._recommendation_payload("sell", current, top, budget, bootstrap) for budget, top in zip(budgets, rankings)]
+
+    def _recommendation_payload(self, action, current, top, budget, bootstrap=None):
+        payload = recommendation_payload(action, *current, top, budget)
+        if bootstrap is not None:
+            payload["bootstrap"] = self.bootstrap_candidates(action, budget, [candidate[0] for candidate in top], **bootstrap)
+        return payload
+
+
+def batch_recommendations(market_data, portfolios, actions=("buy", "sell"), risk_free_rate=0.045, sharpe_penalization=1, window=None):
+    """
+    Buy/sell recommendations for many portfolios with shared matrix operations.
+    The portfolios' weights are stacked into one (portfolios x tickers) matrix, so every portfolio's
+    covariance with every ticker comes from a single matrix product instead of one PortfolioManager each.
+    :param market_data: MarketData store
+    :param portfolios: List of {"tickers": [...], "amounts": [...], "budget": float}
+    :param actions: Which recommendations to compute ("buy" and/or "sell")
+    :param window: Lookback for the statistics, as in PortfolioManager
+    :return: One {"buy": payload, "sell": payload} dict per portfolio, payloads as in get_*_recommendations
+    """
+    moments = market_data.window_moments(window)
+    n_stocks = len(market_data.tickers)
+
+    weights = np.zeros((len(portfolios), n_stocks))
+    values = np.zeros(len(portfolios))
+    budgets = np.zeros(len(portfolios))
+    for row, portfolio in enumerate(portfolios):
+        values[row] = sum(portfolio["amounts"])
+        budgets[row] = float(portfolio.get("budget", 0))
+        for stock, amount in zip(portfolio["tickers"], portfolio["amounts"]):
+            if stock in market_data.index:  # Stocks without data are dropped, as in PortfolioManager
+                weights[row, market_data.index[stock]] = amount / values[row]
+
+    cov_with_portfolios = moments.cov_with_portfolios(weights)  # (portfolios x tickers)
+    means = weights @ moments.mean
+    variances = np.einsum("ij,ij->i", cov_with_portfolios, weights)
+
+    current_returns = means * 252
+    current_stds = np.sqrt(np.maximum(variances, 0)) * np.sqrt(252)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        current_sharpes = (current_returns - risk_free_rate) / (current_stds ** sharpe_penalization)
+
+    results = [{} for _ in portfolios]
+
+    if "buy" in actions:
+        new_weights = (budgets / (values + budgets))[:, None]
+        sharpe, expected_new_return, expected_new_std = blended_metrics(
+            moments, 1 - new_weights, new_weights, slice(None), means[:, None], variances[:, None],
+            cov_with_portfolios, risk_free_rate, sharpe_penalization
+        )
+        for row in range(len(portfolios)):
+            columns = np.flatnonzero(~(weights[row] > 0.06))  # Skip stocks that are already overweighted
+            top = [
+                (market_data.tickers[columns[i]], sharpe[row, columns[i]], expected_new_return[row, columns[i]], expected_new_std[row, columns[i]])
+                for i in top_k(sharpe[row, columns], 5)
+            ]
+            results[row]["buy"] = recommendation_payload(
+                "buy", current_returns[row], current_stds[row], current_sharpes[row], top, budgets[row]
+            )
+
+    if "sell" in actions:
+        # Only held positions can be sold: work on the (portfolio, ticker) pairs of the sparse weight matrix
+        rows, columns = np.nonzero(weights)
+        V_old, V_new = values[rows], values[rows] - budgets[rows]
+        sellable = ~(budgets[rows] > weights[rows, columns] * V_old)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sharpe, expected_new_return, expected_new_std = blended_metrics(
+                moments, V_old / V_new, -budgets[rows] / V_new, columns, means[rows], variances[rows],
+                cov_with_portfolios[rows, columns], risk_free_rate, sharpe_penalization
+            )
+        valid = sellable & ~(expected_new_std <= 0)
+        bounds = np.searchsorted(rows, np.arange(len(portfolios) + 1))  # np.nonzero returns the pairs row by row
+        for row in range(len(portfolios)):
+            pairs = bounds[row] + np.flatnonzero(valid[bounds[row]:bounds[row + 1]])
+            top = [
+                (market_data.tickers[columns[pairs[i]]], sharpe[pairs[i]], expected_new_return[pairs[i]], expected_new_std[pairs[i]])
+                for i in top_k(sharpe[pairs], 5)
+            ]
+            results[row]["sell"] = recommendation_payload(
+                "sell", current_returns[row], current_stds[row], current_sharpes[row], top, budgets[row]
+            )
+
+    for row, result in enumerate(results):
+        for payload in result.values():
+            payload["portfolio_value"] = values[row]
+    return results
+
+
+def portfolio_recommendations(market_data, action, tickers, amounts, budget, budgets=None, window=None, bootstrap=None):
+    """
+    Buy, sell or swap recommendations for one portfolio, as served by the API.
+    :param action: "buy", "sell" or "swap" (swap ranks budget only, without budgets or bootstrap)
+    :param budgets: Optional list of budgets; if given, every budget is ranked in one pass instead of budget
+    :param bootstrap: Optional PortfolioManager.bootstrap_candidates options, to add confidence intervals
+    :return: The get_*_recommendations payload (or {"results": [...]} for a sweep) plus the portfolio value
+    """
+    pm = PortfolioManager(list(tickers), list(amounts), market_data, window=window)
+
+    if action == "swap":
+        result = pm.get_swap_recommendations(budget)
+        result["portfolio_value"] = pm.portfolio_value
+        return result
+
+    if budgets:
+        if action == "buy":
+            results = pm.get_buy_recommendations_sweep(budgets, bootstrap)
+        else:
+            results = pm.get_sell_recommendations_sweep(budgets, bootstrap)
+        return {"results": results, "portfolio_value": pm.portfolio_value}
+
+    result = pm.get_buy_recommendations(budget, bootstrap) if action == "buy" else pm.get_sell_recommendations(budget, bootstrap)
+    result["portfolio_value"] = pm.portfolio_value  # Add total value for context
+    return result
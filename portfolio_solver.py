@@ -0,0 +1,254 @@
+"""
+Direct long-only portfolio weight solvers.
+Work straight from the daily mean vector and covariance matrix of the market data,
+so an optimized allocation doesn't need hundreds of simulated buy/sell steps.
+"""
+
+import numpy as np
+
+
+def project_capped_simplex(v, cap=None):
+    """
+    Euclidean projection of v onto {w : w >= 0, sum(w) = 1, w <= cap}, in O(N log N).
+    The projection is clip(v - tau, 0, cap); sum(clip(v - tau, 0, cap)) is piecewise linear in tau
+    with breakpoints at v - cap and v, so tau is found by one sort and a cumulative sum.
+    """
+    if cap is None:
+        u = np.sort(v)[::-1]
+        cumulative = np.cumsum(u) - 1
+        k = np.flatnonzero(u - cumulative / np.arange(1, len(v) + 1) > 0)[-1]
+        return np.maximum(v - cumulative[k] / (k + 1), 0)
+
+    breakpoints = np.concatenate([v - cap, v])
+    slope_changes = np.concatenate([-np.ones(len(v)), np.ones(len(v))])
+    order = np.argsort(breakpoints, kind="stable")
+    breakpoints, slopes = breakpoints[order], np.cumsum(slope_changes[order])
+    # Total weight at every breakpoint, starting from all assets at the cap
+    totals = len(v) * cap + np.concatenate([[0.0], np.cumsum(slopes[:-1] * np.diff(breakpoints))])
+    k = np.flatnonzero(totals <= 1)[0]
+    tau = breakpoints[k - 1] + (totals[k - 1] - 1) / -slopes[k - 1] if k > 0 else breakpoints[0]
+    return np.clip(v - tau, 0, cap)
+
+
+def _largest_eigenvalue(cov, iterations=50):
+    """Power iteration estimate of the covariance's largest eigenvalue (the gradient's Lipschitz constant)."""
+    x = np.ones(len(cov)) / np.sqrt(len(cov))
+    value = 0.0
+    for _ in range(iterations):
+        y = cov @ x
+        value = np.linalg.norm(y)
+        if value == 0:
+            break
+        x = y / value
+    return value
+
+
+def _check_cap(n_assets, cap):
+    if cap is not None and cap * n_assets < 1:
+        raise ValueError(f"Cap {cap} is infeasible for {n_assets} assets (weights must sum to 1)")
+
+
+def solve_mean_variance(mean, cov, risk_aversion, cap=None, initial_weights=None, max_iterations=5000, tol=1e-8, lipschitz=None):
+    """
+    Long-only weights maximizing mean @ w - risk_aversion / 2 * w @ cov @ w.
+    Accelerated projected gradient, restarting the momentum whenever it stops helping.
+    :param risk_aversion: Trade-off between return and variance; large values approach the minimum-variance portfolio
+    :param cap: Optional maximum weight per asset
+    :param initial_weights: Warm start, e.g. the solution for a nearby risk_aversion
+    :param lipschitz: Largest covariance eigenvalue, if already known
+    """
+    _check_cap(len(mean), cap)
+    if lipschitz is None:
+        lipschitz = _largest_eigenvalue(cov)
+    step = 1.0 / (risk_aversion * lipschitz)
+
+    w = project_capped_simplex(np.full(len(mean), 1.0 / len(mean)) if initial_weights is None else initial_weights, cap)
+    y, t = w, 1.0
+    for _ in range(max_iterations):
+        gradient = mean - risk_aversion * (cov @ y)
+        w_next = project_capped_simplex(y + step * gradient, cap)
+        if np.abs(w_next - w).max() < tol:
+            return w_next
+        if gradient @ (w_next - w) < 0:
+            t = 1.0  # Momentum points downhill: restart from the plain gradient step
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        y = w_next + ((t - 1) / t_next) * (w_next - w)
+        w, t = w_next, t_next
+    return w
+
+
+def solve_min_variance(mean, cov, target_return=None, cap=None, initial_weights=None, iterations=60, return_tol=1e-4):
+    """
+    Long-only minimum-variance weights, optionally with mean @ w >= target_return (daily units).
+    The target is met by bisecting the risk aversion of solve_mean_variance, warm-starting every solve,
+    until the return is within return_tol (relative) above the target.
+    """
+    lipschitz = _largest_eigenvalue(cov)
+    # Risk aversion this large makes the return term negligible: the global minimum-variance portfolio
+    w = solve_mean_variance(mean, cov, 1e6 / lipschitz, cap, initial_weights, lipschitz=lipschitz)
+    if target_return is None or mean @ w >= target_return:
+        return w
+
+    # Return falls as risk aversion rises: bracket the target in log risk aversion and close in on it with
+    # regula falsi (Illinois variant), keeping the last solution that still reaches the target
+    lo, hi = np.log(1e-3 / lipschitz), np.log(1e6 / lipschitz)
+    best = solve_mean_variance(mean, cov, np.exp(lo), cap, w, lipschitz=lipschitz)
+    if mean @ best < target_return:
+        raise ValueError(f"Target return {target_return} (daily) is above the highest achievable return {mean @ best}")
+    f_lo, f_hi = mean @ best - target_return, mean @ w - target_return
+    side = 0
+    for _ in range(iterations):
+        mid = (lo * f_hi - hi * f_lo) / (f_hi - f_lo)
+        w = solve_mean_variance(mean, cov, np.exp(mid), cap, best, lipschitz=lipschitz)
+        f_mid = mean @ w - target_return
+        if f_mid >= 0:
+            lo, f_lo, best = mid, f_mid, w
+            if side == 1:
+                f_hi /= 2
+            side = 1
+        else:
+            hi, f_hi = mid, f_mid
+            if side == -1:
+                f_lo /= 2
+            side = -1
+        if hi - lo < 1e-6 or mean @ best - target_return <= return_tol * abs(target_return):
+            break
+    return best
+
+
+def solve_max_sharpe(mean, cov, risk_free_rate=0.0, cap=None, initial_weights=None, max_iterations=5000, tol=1e-10):
+    """
+    Long-only weights maximizing (mean @ w - risk_free_rate) / sqrt(w @ cov @ w) (daily units).
+    Projected gradient ascent with a backtracking step; the Sharpe ratio is pseudo-concave where it is
+    positive, so the stationary point found is the global maximum.
+    """
+    _check_cap(len(mean), cap)
+
+    def sharpe_and_gradient(w):
+        cov_w = cov @ w
+        std = np.sqrt(w @ cov_w)
+        excess = mean @ w - risk_free_rate
+        return excess / std, mean / std - excess * cov_w / std ** 3
+
+    w = project_capped_simplex(np.full(len(mean), 1.0 / len(mean)) if initial_weights is None else initial_weights, cap)
+    sharpe, gradient = sharpe_and_gradient(w)
+    step = 1.0 / np.abs(gradient).max()
+    for _ in range(max_iterations):
+        while True:
+            w_next = project_capped_simplex(w + step * gradient, cap)
+            delta = w_next - w
+            sharpe_next, gradient_next = sharpe_and_gradient(w_next)
+            if sharpe_next >= sharpe + gradient @ delta - (delta @ delta) / (2 * step) or step < 1e-20:
+                break
+            step /= 2
+        if np.abs(delta).max() < tol:
+            return w_next
+        w, sharpe, gradient = w_next, sharpe_next, gradient_next
+        step *= 2  # Let the step grow back after backtracking
+    return w
+
+
+def max_return_weights(mean, cap=None):
+    """Long-only weights with the highest mean: all in the best asset, or the best assets filled to the cap in turn."""
+    _check_cap(len(mean), cap)
+    order = np.argsort(-mean, kind="stable")
+    w = np.zeros(len(mean))
+    if cap is None:
+        w[order[0]] = 1.0
+        return w
+    n_full = min(int(1 / cap), len(mean))
+    w[order[:n_full]] = cap
+    if n_full < len(mean):
+        w[order[n_full]] = max(1 - n_full * cap, 0)
+    return w
+
+
+def solve_active_set(mean, cov, risk_aversion, support, cap=None, max_iterations=25, tol=1e-10):
+    """
+    Exact solve_mean_variance optimum by guessing which assets are free, at zero and at the cap.
+    With the guess fixed, the optimality conditions are one linear system over the free assets; every
+    asset that breaks a bound or would rather move is switched over and the system solved again.
+    From a neighbouring solution's pattern this typically takes a few small solves.
+    :param support: Weights whose pattern is the first guess, e.g. the solution for a nearby risk_aversion
+    :return: The weights, or None if the guesses didn't settle within max_iterations
+    """
+    capped = np.zeros(len(mean), dtype=bool) if cap is None else support >= cap - tol
+    free = (support > tol) & ~capped
+    scale = tol * max(np.abs(mean).max(), np.finfo(np.float64).tiny)
+    for _ in range(max_iterations):
+        if not free.any():
+            return None
+        w = np.zeros(len(mean))
+        if cap is not None:
+            w[capped] = cap
+        # On the free assets mean - risk_aversion * cov @ w equals the budget multiplier gamma
+        rhs = mean[free] / risk_aversion
+        if capped.any():
+            rhs = rhs - cov[np.ix_(free, capped)] @ w[capped]
+        try:
+            a, b = np.linalg.solve(cov[np.ix_(free, free)], np.column_stack([rhs, np.full(free.sum(), 1 / risk_aversion)])).T
+        except np.linalg.LinAlgError:
+            return None
+        gamma = (a.sum() - (1 - w[capped].sum())) / b.sum()
+        w[free] = a - gamma * b
+        gradient = mean - risk_aversion * (cov @ w) - gamma
+
+        below = free & (w < -tol)
+        above = free & (w > cap + tol) if cap is not None else np.zeros(len(mean), dtype=bool)
+        enter = ~free & ~capped & (gradient > scale)
+        release = capped & (gradient < -scale)
+        if not (below.any() or above.any() or enter.any() or release.any()):
+            return np.clip(w, 0, cap)
+        free = (free & ~below & ~above) | enter | release
+        capped = (capped & ~release) | above
+    return None
+
+
+def efficient_frontier(mean, cov, n_points=50, cap=None, tol=1e-7):
+    """
+    Long-only efficient frontier: n_points weight vectors from the minimum-variance portfolio to the
+    highest-return one, roughly evenly spaced in return.
+    Every point reuses its neighbour: first as the guess of which assets are held (solve_active_set),
+    then, if that fails, as the warm start of solve_mean_variance. Frontier weights are piecewise linear in
+    1 / risk_aversion (the critical line algorithm), so extrapolating the last two points to the next
+    target return gives a close risk aversion without bisecting.
+    :return: (points x assets) array of weights
+    """
+    _check_cap(len(mean), cap)
+    lipschitz = _largest_eigenvalue(cov)
+    t_min, t_max = 1e-6 * lipschitz, 1e3 * lipschitz  # 1 / risk_aversion, the range solve_min_variance brackets
+
+    def solve(t, previous):
+        w = solve_active_set(mean, cov, 1 / t, previous, cap)
+        if w is None:
+            w = solve_mean_variance(mean, cov, 1 / t, cap, previous, tol=tol, lipschitz=lipschitz)
+        return w
+
+    w = solve(t_min, solve_mean_variance(mean, cov, 1 / t_min, cap, tol=tol, lipschitz=lipschitz))
+    w_max = max_return_weights(mean, cap)
+    highest = mean @ w_max
+    weights, ts, returns = [w], [t_min], [mean @ w]
+    while len(weights) < n_points - 1 and ts[-1] < t_max:
+        target = returns[-1] + (highest - returns[-1]) / (n_points - len(weights))
+        if len(ts) > 1 and returns[-1] > returns[-2]:
+            t = ts[-1] + (target - returns[-1]) * (ts[-1] - ts[-2]) / (returns[-1] - returns[-2])
+        else:
+            t = max(10 * ts[-1], 1e-3 * lipschitz)  # Flat so far (e.g. at the minimum-variance portfolio): probe further out
+        t = min(max(t, 1.01 * ts[-1]), 10 * ts[-1], t_max)
+        w = solve(t, weights[-1])
+        if len(weights) > 1 and mean @ w - returns[-1] < 0.1 * (target - returns[-1]):
+            weights.pop(), ts.pop(), returns.pop()  # Hardly moved: move the probe instead of crowding the points
+        weights.append(w)
+        ts.append(t)
+        returns.append(mean @ w)
+    weights.append(w_max)
+    return np.array(weights)
+
+
+def trade_list(tickers, current_amounts, target_amounts, min_trade=1.0):
+    """Trades turning current_amounts into target_amounts: sells first (they fund the buys), largest first."""
+    differences = np.asarray(target_amounts) - np.asarray(current_amounts)
+    order = np.argsort(-np.abs(differences), kind="stable")
+    sells = [{"action": "sell", "ticker": tickers[i], "amount": -differences[i]} for i in order if differences[i] <= -min_trade]
+    buys = [{"action": "buy", "ticker": tickers[i], "amount": differences[i]} for i in order if differences[i] >= min_trade]
+    return sells + buys
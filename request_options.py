@@ -0,0 +1,71 @@
+"""
+Validation of the optional request fields shared by the Flask (api_server) and FastAPI (asgi_server) routes.
+Every helper returns (value, error message or None), and the routes answer 400 with the message.
+Nothing here imports numpy/pandas, so api_server still starts without them.
+"""
+
+import os
+
+MAX_BUDGETS = int(os.getenv("MAX_BUDGETS", "100"))  # Amounts in one budget sweep
+MAX_BOOTSTRAP_RESAMPLES = int(os.getenv("MAX_BOOTSTRAP_RESAMPLES", "20000"))
+
+
+def budget_sweep(budgets):
+    """
+    Amounts from the optional "budgets" request field: a list of up to MAX_BUDGETS numbers.
+    :return: (list of floats or None, error message or None)
+    """
+    if budgets is None:
+        return None, None
+    if not isinstance(budgets, list):
+        return None, "Invalid budgets: expected a list of amounts"
+    if len(budgets) > MAX_BUDGETS:
+        return None, f"Invalid budgets: at most {MAX_BUDGETS} amounts"
+    try:
+        return [float(b) for b in budgets] or None, None
+    except (ValueError, TypeError) as e:
+        return None, f"Invalid budgets: {e}"
+
+
+def bootstrap_options(bootstrap):
+    """
+    PortfolioManager.bootstrap_candidates options from the optional "bootstrap" request field:
+    true for the defaults, or {"resamples": 5000, "block_length": 21, "confidence": 0.95}.
+    :return: (options or None, error message or None)
+    """
+    if bootstrap is None or bootstrap is False:
+        return None, None
+    if bootstrap is True:
+        return {}, None
+    if not isinstance(bootstrap, dict):
+        return None, "Invalid bootstrap: expected true, false or an object of options"
+    try:
+        options = {}
+        if "resamples" in bootstrap:
+            options["n_resamples"] = int(bootstrap["resamples"])
+            if not 1 <= options["n_resamples"] <= MAX_BOOTSTRAP_RESAMPLES:
+                return None, f"Invalid bootstrap: resamples must be between 1 and {MAX_BOOTSTRAP_RESAMPLES}"
+        if "block_length" in bootstrap:
+            options["block_length"] = int(bootstrap["block_length"])
+            if options["block_length"] < 1:
+                return None, "Invalid bootstrap: block_length must be at least 1"
+        if "confidence" in bootstrap:
+            options["confidence"] = float(bootstrap["confidence"])
+            if not 0 < options["confidence"] < 1:
+                return None, "Invalid bootstrap: confidence must be between 0 and 1"
+    except (ValueError, TypeError) as e:
+        return None, f"Invalid bootstrap: {e}"
+    return options, None
+
+
+def parse_window(data, market_data):
+    """
+    Lookback window from the optional "window" request field: "1y"/"3y"/"5y"/"10y" or {"start": ..., "end": ...}.
+    :return: (window or None, error message or None)
+    """
+    window = data.get("window")
+    try:
+        market_data.window_rows(window)
+    except (ValueError, TypeError, AttributeError) as e:
+        return None, f"Invalid window: {e}"
+    return window, None
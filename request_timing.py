@@ -0,0 +1,116 @@
+"""
+Per-request stage timing.
+Code on the request path wraps its stages in `with stage("name"):`; the durations of the current request
+are reported in its Server-Timing header and aggregated into per-route histograms for the metrics endpoint.
+Outside a request (scripts, tests) stage() records nothing, so the library code can stay instrumented.
+"""
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+
+REQUEST_TIMING = os.getenv("REQUEST_TIMING", "1") == "1"
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class _Stage:
+    __slots__ = ("name", "timings", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = _timings.get()
+        if self.timings is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            # Repeated stages (e.g. ranking inside the greedy optimizer) add up
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+def stage(name):
+    """Context manager adding the time spent inside it to the current request's stage `name`."""
+    return _Stage(name)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one counts values above every bound
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StageMetrics:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}  # (route, stage) -> Histogram
+        self._lock = threading.Lock()
+
+    def observe(self, route, timings):
+        with self._lock:
+            for name, seconds in timings.items():
+                histogram = self._histograms.get((route, name))
+                if histogram is None:
+                    histogram = self._histograms[(route, name)] = Histogram(self.buckets)
+                histogram.observe(seconds)
+
+    def prometheus_text(self):
+        """All histograms in the Prometheus text exposition format."""
+        lines = [
+            "# HELP request_stage_seconds Time spent in each stage of a request.",
+            "# TYPE request_stage_seconds histogram",
+        ]
+        with self._lock:
+            for (route, name), histogram in sorted(self._histograms.items()):
+                labels = f'route="{route}",stage="{name}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'request_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"request_stage_seconds_sum{{{labels}}} {histogram.sum!r}")
+                lines.append(f"request_stage_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+stage_metrics = StageMetrics()
+
+
+def start_request():
+    """Begin collecting stages for the current request. Returns a token for finish_request (None when disabled)."""
+    if not REQUEST_TIMING:
+        return None
+    timings = {}
+    _timings.set(timings)
+    return timings, time.perf_counter()
+
+
+def finish_request(token, route):
+    """Stop collecting, record the stages (plus "total") under route and return them, in seconds."""
+    if token is None:
+        return {}
+    timings, start = token
+    _timings.set(None)
+    timings["total"] = time.perf_counter() - start
+    stage_metrics.observe(route, timings)
+    return timings
+
+
+def server_timing_header(timings):
+    """Server-Timing header value, durations in milliseconds."""
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items())
@@ -0,0 +1,111 @@
+"""
+In-process cache for recommendation results.
+Bounded LRU with a TTL, keyed on a canonical hash of the request, and flushed
+whenever the market data version changes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))  # Seconds
+
+
+def portfolio_key(action, tickers, amounts, budget, data_version, **options):
+    """
+    Canonical hash of a recommendation request.
+    Holdings are keyed as sorted (ticker, amount / total) pairs plus the total, so the order the
+    tickers were sent in doesn't matter; a repeated ticker keeps its last amount, as in PortfolioManager.
+    """
+    holdings = dict(zip(tickers, amounts))
+    total = float(sum(amounts))
+    canonical = {
+        "action": action,
+        "holdings": sorted((ticker, round(amount / total, 12)) for ticker, amount in holdings.items()),
+        "total": total,
+        "budget": budget,
+        "data_version": data_version,
+        "options": options,
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        """
+        :param max_entries: Entries kept before the least recently used one is evicted
+        :param ttl: Seconds an entry stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self._data_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, data_version=None):
+        """Cached result for key, None on a miss. A new data_version drops everything cached before it."""
+        with self._lock:
+            if data_version != self._data_version:
+                # The price data was reloaded: nothing cached so far is valid any more
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._data_version = data_version
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, result, data_version=None):
+        """Store result for key, unless the data was reloaded while it was being computed."""
+        with self._lock:
+            if data_version == self._data_version and self.max_entries > 0:
+                self._entries[key] = (time.monotonic() + self.ttl, result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def get_or_compute(self, key, compute, data_version=None):
+        """Return the cached result for key, or compute, store and return it."""
+        result = self.get(key, data_version)
+        if result is None:
+            result = compute()  # Outside the lock: concurrent misses on other keys don't wait on each other
+            self.put(key, result, data_version)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "data_version": self._data_version,
+            }